@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: procfs/sysfs collector vs. the legacy fork/exec scraping path
+Usage: python3 benchmarks/bench_collector.py [iterations]
+"""
+
+import os
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from collector import SystemCollector
+
+LEGACY_COMMANDS = [
+    ['vcgencmd', 'measure_temp'],
+    ['top', '-bn1'],
+    ['free', '-m'],
+    ['df', '-h', '/'],
+    ['hostname', '-I']
+]
+
+
+def legacy_sample():
+    """Run the commands system_info() used to spawn for every request"""
+    for command in LEGACY_COMMANDS:
+        try:
+            subprocess.run(command, capture_output=True)
+        except FileNotFoundError:
+            pass  # Tool missing on this host; the fork still happened
+
+
+def measure(func, iterations):
+    """Return the mean cost of func() in microseconds"""
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) * 1e6 / iterations
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    collector = SystemCollector()
+    collector.sample()  # Warm up cached descriptors
+
+    native = measure(collector.sample, iterations)
+    legacy = measure(legacy_sample, max(1, iterations // 100))
+
+    print(f"procfs collector: {native:10.1f} us/sample ({iterations} samples)")
+    print(f"fork/exec path:   {legacy:10.1f} us/sample ({max(1, iterations // 100)} samples)")
+    print(f"speedup:          {legacy / native:10.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Load benchmark: eventlet (server.py) vs. asyncio (server_asgi.py) serving
+Measures /api/system-info requests per second, then keystroke echo round
+trips across concurrent terminal sessions while that HTTP load continues.
+Start each mode first, e.g. `python3 server.py` (port 8000) and
+`python3 server_asgi.py --port 8001`, and pass both URLs.
+Usage: python3 benchmarks/bench_serving.py URL [URL ...] [--sessions N]
+       [--seconds S] [--clients C]
+Needs the Socket.IO client extras: pip install "python-socketio[client]"
+"""
+
+import argparse
+import itertools
+import statistics
+import threading
+import time
+import urllib.request
+
+import socketio
+
+
+def percentile(samples, fraction):
+    """Value below which fraction of the samples fall"""
+    if not samples:
+        return float('nan')
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+class MetricsLoad:
+    """Threads requesting /api/system-info back to back"""
+
+    def __init__(self, url, clients):
+        self.url = url + '/api/system-info'
+        self.clients = clients
+        self.latencies = []
+        self.errors = 0
+        self.running = False
+        self.threads = []
+
+    def _worker(self):
+        while self.running:
+            started = time.perf_counter()
+            try:
+                with urllib.request.urlopen(self.url, timeout=10) as response:
+                    response.read()
+            except OSError:
+                self.errors += 1
+                continue
+            self.latencies.append(time.perf_counter() - started)
+
+    def start(self):
+        self.running = True
+        self.threads = [threading.Thread(target=self._worker, daemon=True)
+                        for _ in range(self.clients)]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.running = False
+        for thread in self.threads:
+            thread.join()
+
+
+class TerminalClient:
+    """One terminal session timing `echo` round trips
+
+    Each command prints the result of shell arithmetic, so the marker only
+    shows up in output once the shell has run it, not in the echoed input.
+    """
+
+    def __init__(self, url, name):
+        self.url = url
+        self.name = name
+        self.client = socketio.Client(reconnection=False)
+        self.output = bytearray()
+        self.ready = threading.Event()
+        self.latencies = []
+        self.client.on('terminal_output', self._on_output)
+
+    def _on_output(self, payload):
+        if isinstance(payload, dict):
+            data = payload.get('data', '').encode()
+            size = payload.get('size', 0)
+        else:
+            data = payload
+            size = len(payload)
+        if size:
+            self.client.emit('terminal_ack', {'size': size})
+        self.output += data
+        self.ready.set()
+
+    def connect(self):
+        self.client.connect(self.url, transports=['websocket'])
+        self.client.emit('terminal_connect', {'cols': 80, 'rows': 24, 'binary': True})
+
+    def round_trip(self, n, timeout=10):
+        """Run one echo through the shell; returns seconds or None on timeout"""
+        marker = f"{self.name}-{n + 1}".encode()
+        self.output.clear()
+        started = time.perf_counter()
+        self.client.emit('terminal_input', f"echo {self.name}-$(({n}+1))\n".encode())
+        deadline = started + timeout
+        while marker not in self.output:
+            self.ready.clear()
+            if not self.ready.wait(deadline - time.perf_counter()):
+                return None
+        return time.perf_counter() - started
+
+    def run(self, stop_at):
+        for n in itertools.count():
+            if time.perf_counter() >= stop_at:
+                break
+            elapsed = self.round_trip(n)
+            if elapsed is not None:
+                self.latencies.append(elapsed)
+
+    def close(self):
+        self.client.emit('terminal_close')
+        self.client.disconnect()
+
+
+def bench_metrics(url, clients, seconds):
+    load = MetricsLoad(url, clients)
+    load.start()
+    time.sleep(seconds)
+    load.stop()
+    return load
+
+
+def bench_terminals(url, sessions, clients, seconds):
+    terminals = [TerminalClient(url, f"bench{i}") for i in range(sessions)]
+    for terminal in terminals:
+        terminal.connect()
+    time.sleep(1)  # Let every shell print its prompt
+
+    load = MetricsLoad(url, clients)
+    load.start()
+    stop_at = time.perf_counter() + seconds
+    threads = [threading.Thread(target=terminal.run, args=(stop_at,)) for terminal in terminals]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    load.stop()
+
+    for terminal in terminals:
+        terminal.close()
+    return [latency for terminal in terminals for latency in terminal.latencies], load
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('urls', nargs='+', help='portal base URL per serving mode')
+    parser.add_argument('--sessions', type=int, default=6, help='concurrent terminal sessions')
+    parser.add_argument('--clients', type=int, default=8, help='concurrent HTTP clients')
+    parser.add_argument('--seconds', type=float, default=10, help='duration of each phase')
+    args = parser.parse_args()
+
+    for url in args.urls:
+        url = url.rstrip('/')
+        print(url)
+
+        load = bench_metrics(url, args.clients, args.seconds)
+        print(f"  system-info alone:     {len(load.latencies) / args.seconds:8.1f} req/s"
+              f"  p50 {percentile(load.latencies, 0.5) * 1000:7.1f} ms"
+              f"  p99 {percentile(load.latencies, 0.99) * 1000:7.1f} ms"
+              f"  ({load.errors} errors)")
+
+        echoes, load = bench_terminals(url, args.sessions, args.clients, args.seconds)
+        print(f"  {args.sessions} terminals, echo:   {len(echoes) / args.seconds:8.1f} rt/s"
+              f"  p50 {percentile(echoes, 0.5) * 1000:7.1f} ms"
+              f"  p99 {percentile(echoes, 0.99) * 1000:7.1f} ms"
+              f"  max {max(echoes, default=float('nan')) * 1000:7.1f} ms")
+        print(f"  system-info alongside: {len(load.latencies) / args.seconds:8.1f} req/s"
+              f"  p50 {percentile(load.latencies, 0.5) * 1000:7.1f} ms"
+              f"  mean {statistics.fmean(load.latencies or [float('nan')]) * 1000:6.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
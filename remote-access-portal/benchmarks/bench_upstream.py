@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: pooled keep-alive upstream client vs. a connection per request
+A local HTTP/1.1 stub stands in for Node-RED/BMS/weather; --handshake-ms
+delays each new connection to mimic TCP+TLS setup to a remote upstream.
+Usage: python3 benchmarks/bench_upstream.py [requests] [--concurrency N]
+       [--handshake-ms MS]
+"""
+
+import argparse
+import http.client
+import os
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from upstream import UpstreamClient
+
+BODY = b'{"temperature": 72, "condition": "Clear", "humidity": 40}'
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Keep-alive JSON endpoint; the first request on a connection pays the handshake"""
+
+    protocol_version = 'HTTP/1.1'
+    handshake = 0.0
+
+    def setup(self):
+        super().setup()
+        # Headers and body go out in separate writes; don't let Nagle hold the body
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        time.sleep(self.handshake)
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+def unpooled_get(port):
+    """What an upstream call costs without a pool: connect, request, close"""
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    try:
+        connection.request('GET', '/data', headers={'Connection': 'close'})
+        connection.getresponse().read()
+    finally:
+        connection.close()
+
+
+def measure(func, requests, concurrency):
+    """Per-request latencies in milliseconds, sorted"""
+    def timed(_):
+        started = time.perf_counter()
+        func()
+        return (time.perf_counter() - started) * 1000
+
+    with ThreadPoolExecutor(concurrency) as executor:
+        return sorted(executor.map(timed, range(requests)))
+
+
+def report(label, latencies):
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    print(f"{label:22} p50 {p50:8.2f} ms   p99 {p99:8.2f} ms   ({len(latencies)} requests)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('requests', type=int, nargs='?', default=1000)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--handshake-ms', type=float, default=20,
+                        help='delay for each new connection (0 for plain loopback)')
+    args = parser.parse_args()
+
+    StubHandler.handshake = args.handshake_ms / 1000
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+    url = f"http://127.0.0.1:{port}/data"
+
+    client = UpstreamClient(max_per_host=args.concurrency)
+    client.request('GET', url)  # Warm up one pooled connection
+
+    report('connection per request', measure(lambda: unpooled_get(port),
+                                             args.requests, args.concurrency))
+    report('pooled keep-alive', measure(lambda: client.request('GET', url),
+                                        args.requests, args.concurrency))
+    print(f"pool: {client.status()['hosts'][f'http://127.0.0.1:{port}']}")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
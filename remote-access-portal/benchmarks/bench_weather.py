@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark: shared weather cache under many polling clients
+A local stub stands in for OpenWeatherMap and counts the lookups it
+receives; --latency-ms delays each answer like a remote API would.
+Usage: python3 benchmarks/bench_weather.py [clients] [--seconds S]
+       [--interval S] [--latency-ms MS]
+"""
+
+import argparse
+import json
+import os
+import socket
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from upstream import UpstreamClient
+from weather import WeatherCache, openweather_fetcher
+
+BODY = json.dumps({
+    'name': 'Stubville', 'main': {'temp': 71.6, 'humidity': 40, 'pressure': 1015,
+                                  'feels_like': 70.2},
+    'weather': [{'main': 'Clear', 'icon': '01d'}], 'wind': {'speed': 5.4, 'deg': 180}
+}).encode()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    """OpenWeatherMap's /weather endpoint, counting requests"""
+
+    protocol_version = 'HTTP/1.1'
+    latency = 0.0
+    lookups = 0
+
+    def setup(self):
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def do_GET(self):
+        StubHandler.lookups += 1
+        time.sleep(self.latency)
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+def start_task(func, *args):
+    thread = threading.Thread(target=func, args=args, daemon=True)
+    thread.start()
+    return thread
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('clients', type=int, nargs='?', default=50)
+    parser.add_argument('--seconds', type=float, default=5)
+    parser.add_argument('--interval', type=float, default=1,
+                        help='weather update interval in seconds')
+    parser.add_argument('--latency-ms', type=float, default=200)
+    args = parser.parse_args()
+
+    StubHandler.latency = args.latency_ms / 1000
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/data/2.5/weather"
+
+    client = UpstreamClient(max_per_host=4)
+    cache = WeatherCache(openweather_fetcher(client, url, 'stub-key'), start_task,
+                         threading.Event, interval=args.interval)
+
+    latencies = []
+    deadline = time.monotonic() + args.seconds
+
+    def poll():
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            cache.get('Stubville,US', 'imperial')
+            latencies.append((time.perf_counter() - started) * 1000)
+            time.sleep(0.01)
+
+    threads = [start_task(poll) for _ in range(args.clients)]
+    for thread in threads:
+        thread.join()
+    time.sleep(args.latency_ms / 1000 * 2)  # Let a last background refresh land
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2]
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))]
+    expected = int(args.seconds / args.interval) + 1
+    print(f"{args.clients} clients, {len(latencies)} lookups in {args.seconds:.0f}s: "
+          f"p50 {p50:.2f} ms   p99 {p99:.2f} ms")
+    print(f"upstream requests: {StubHandler.lookups} (at most ~{expected} for a "
+          f"{args.interval:g}s interval)")
+    print(f"cache: {cache.status()}")
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
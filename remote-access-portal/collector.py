@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Automata Remote Access Portal - System Metrics Collector
+Reads CPU, memory, disk, temperature and network data directly from
+procfs/sysfs instead of forking vcgencmd, top, free, df and hostname
+"""
+
+import fcntl
+import math
+import os
+import socket
+import struct
+
+PROC_STAT = '/proc/stat'
+PROC_MEMINFO = '/proc/meminfo'
+THERMAL_ZONE = '/sys/class/thermal/thermal_zone0/temp'
+
+SIOCGIFADDR = 0x8915
+
+
+def format_size(num_bytes):
+    """Format a byte count the way `df -h` does (e.g. 7.4G, 12G)"""
+    value = float(num_bytes)
+    for unit in ('', 'K', 'M', 'G', 'T', 'P'):
+        if value < 1024 or unit == 'P':
+            break
+        value /= 1024
+    if not unit:
+        return str(int(value))
+    if value < 10:
+        # df rounds up and keeps one decimal below 10
+        return f"{math.ceil(value * 10) / 10:.1f}{unit}"
+    return f"{math.ceil(value)}{unit}"
+
+
+def parse_cpu_times(line):
+    """Return (busy, total) jiffies from the aggregate `cpu` line of /proc/stat"""
+    fields = [int(value) for value in line.split()[1:9]]
+    idle = fields[3] + (fields[4] if len(fields) > 4 else 0)  # idle + iowait
+    total = sum(fields)
+    return total - idle, total
+
+
+def parse_meminfo(text):
+    """Return /proc/meminfo as a dict of kB values"""
+    info = {}
+    for line in text.splitlines():
+        key, _, value = line.partition(b':')
+        fields = value.split()
+        if fields:
+            info[key.decode()] = int(fields[0])
+    return info
+
+
+class SystemCollector:
+    """Samples system metrics from procfs/sysfs with no process spawns"""
+
+    def __init__(self, disk_path='/'):
+        self.disk_path = disk_path
+        self._fds = {}
+        self._sock = None
+        # Numeric readings from the last sample, for history recording
+        self.readings = {}
+        # CPU times at the previous sample; usage is measured between samples
+        self._cpu_last = None
+
+    def _pread(self, path, size=4096):
+        """Read a procfs/sysfs file through a cached descriptor"""
+        fd = self._fds.get(path)
+        if fd is None:
+            fd = self._fds[path] = os.open(path, os.O_RDONLY)
+        return os.pread(fd, size, 0)
+
+    def read_cpu_times(self):
+        """Read cumulative (busy, total) CPU jiffies"""
+        data = self._pread(PROC_STAT, 512)
+        return parse_cpu_times(data.split(b'\n', 1)[0])
+
+    def read_cpu_usage(self):
+        """CPU usage in percent since the previous sample, or None on the first"""
+        busy, total = self.read_cpu_times()
+        last = self._cpu_last
+        self._cpu_last = (busy, total)
+        if last is None:
+            # Times read at startup would only cover the few busy jiffies
+            # spent importing, so the first sample has nothing to report
+            return None
+        last_busy, last_total = last
+        if total <= last_total:
+            return 0.0
+        return round((busy - last_busy) * 100 / (total - last_total), 1)
+
+    def read_cpu_temp(self):
+        """SoC temperature in degrees Celsius, or None if unavailable"""
+        try:
+            return int(self._pread(THERMAL_ZONE, 32)) / 1000
+        except (OSError, ValueError):
+            return None
+
+    def read_memory(self):
+        """Return (total, used) memory in MB"""
+        info = parse_meminfo(self._pread(PROC_MEMINFO))
+        total = info['MemTotal']
+        available = info.get('MemAvailable',
+                             info['MemFree'] + info.get('Buffers', 0) + info.get('Cached', 0))
+        return total // 1024, (total - available) // 1024
+
+    def read_disk(self):
+        """Return (used_bytes, percent) for the root filesystem like `df`"""
+        st = os.statvfs(self.disk_path)
+        used = (st.f_blocks - st.f_bfree) * st.f_frsize
+        avail = st.f_bavail * st.f_frsize
+        if used + avail == 0:
+            return used, 0
+        return used, math.ceil(used * 100 / (used + avail))
+
+    def read_ip_address(self):
+        """First IPv4 address of a non-loopback interface"""
+        if self._sock is None:
+            self._sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        for _, name in socket.if_nameindex():
+            if name == 'lo':
+                continue
+            try:
+                ifreq = fcntl.ioctl(self._sock.fileno(), SIOCGIFADDR,
+                                    struct.pack('256s', name.encode()[:15]))
+            except OSError:
+                continue  # Interface has no IPv4 address
+            return socket.inet_ntoa(ifreq[20:24])
+        return '127.0.0.1'
+
+    def sample(self):
+        """Take a sample using the same fields as /api/system-info"""
+        cpu_usage = self.read_cpu_usage()
+        cpu_temp = self.read_cpu_temp()
+        mem_total, mem_used = self.read_memory()
+        mem_percent = round((mem_used / mem_total) * 100, 1)
+        disk_used, disk_percent = self.read_disk()
+
+        self.readings = {
+            'cpu': cpu_usage,
+            'mem': mem_percent,
+            'temp': cpu_temp,
+            'disk': disk_percent
+        }
+
+        return {
+            'cpu_temp': f"{cpu_temp:.1f}'C" if cpu_temp is not None else None,
+            'cpu_usage': cpu_usage,
+            'mem_total': mem_total,
+            'mem_used': mem_used,
+            'mem_percent': mem_percent,
+            'disk_used': format_size(disk_used),
+            'disk_percent': f"{disk_percent}%",
+            'hostname': os.uname().nodename,
+            'ip_address': self.read_ip_address()
+        }
+
+    def close(self):
+        """Release cached descriptors"""
+        for fd in self._fds.values():
+            os.close(fd)
+        self._fds.clear()
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
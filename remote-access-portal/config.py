@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""
+Automata Remote Access Portal - Configuration
+Settings shared by the eventlet (server.py) and asyncio (server_asgi.py)
+servers, with the installer's tunnel and .env files read over the defaults
+"""
+
+import os
+
+# Configuration
+CONFIG = {
+    'node_red_url': 'http://127.0.0.1:1880',
+    'nodered_proxy_path': '/node-red',  # Portal path proxying Node-RED (None iframes node_red_url)
+    'nodered_cache_dir': '/var/lib/automata-portal/nodered-cache',  # None caches in memory only
+    'nodered_cache_memory': 16 * 1024 * 1024,  # Bytes of editor assets kept in memory
+    'nodered_cache_ttl': 60,  # Seconds before a cached asset is revalidated with Node-RED
+    'nodered_cache_prefixes': ['/vendor/', '/red/', '/icons/', '/locales/', '/types/', '/theme/'],
+    'upstream_max_per_host': 4,  # Open connections per upstream host (Node-RED, BMS, weather)
+    'upstream_timeout': 10,  # Seconds to connect or wait for an upstream answer
+    'upstream_retries': 2,  # Extra attempts for failed idempotent upstream calls
+    'neural_bms_url': 'https://neuralbms.automatacontrols.com',
+    'env_file': os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env'),  # Installer's settings
+    'weather_enabled': False,  # WEATHER_ENABLED in env_file
+    'location': 'Local',  # LOCATION, shown while weather is disabled
+    'weather_location': 'New York,US',  # WEATHER_LOCATION
+    'weather_units': 'imperial',  # WEATHER_UNITS
+    'weather_update_interval': 600,  # Seconds (WEATHER_UPDATE_INTERVAL is in ms); one lookup per interval
+    'weather_api_key': None,  # OPENWEATHER_API
+    'weather_api_url': 'https://api.openweathermap.org/data/2.5/weather',
+    'controller_serial': None,  # Will be loaded from config file
+    'portal_port': 8000,
+    'event_loop': 'auto',  # server_asgi.py only: 'auto' (uvloop if installed), 'asyncio' or 'uvloop'
+    'metrics_interval': 5,  # Seconds between system metric samples
+    'metrics_max_push_interval': 300,  # Slowest push rate a client may request
+    'metrics_raw_seconds': 3600,  # Raw sample history kept for /api/metrics/history
+    'metrics_rollups': [  # (resolution, retention) in seconds for min/max/avg tiers
+        (60, 7 * 24 * 3600),
+        (3600, 365 * 24 * 3600)
+    ],
+    'metrics_history_dir': '/var/lib/automata-portal',  # None keeps history in memory
+    'metrics_history_max_points': 1000,  # Largest downsampled series returned
+    'monitored_services': ['nginx', 'automata-portal', 'nodered', 'cloudflared'],
+    'service_check_ttl': 10,  # Seconds systemd unit states are cached
+    'service_check_timeout': 2,  # Give up on a systemctl probe after this long
+    'terminal_frame_size': 16384,  # Flush terminal output at this many bytes...
+    'terminal_frame_delay': 0.01,  # ...or this many seconds after the first byte
+    'terminal_high_water': 262144,  # Stop reading the PTY above this many unacked bytes
+    'terminal_low_water': 65536,  # Resume reading once unacked bytes drop to this
+    'terminal_scrollback_bytes': 262144,  # Output kept per session for reconnects
+    'terminal_detach_timeout': 900,  # Seconds a detached shell waits for its client
+    'terminal_pool_size': 2,  # Warm shells kept ready for new terminals (0 disables)
+    'terminal_pool_max_idle': 1800,  # Seconds before an unused warm shell is recycled
+    'terminal_max_sessions': 8,  # Concurrent shells; the longest-idle detached one is evicted
+    'terminal_idle_timeout': 4 * 3600,  # Close shells with no input or output for this long
+    'terminal_max_lifetime': 24 * 3600,  # Close shells this long after they were opened
+    'terminal_check_interval': 5,  # Seconds between timeout checks and child reaping
+    'terminal_recording': False,  # Record terminal output for audit/support replay
+    'terminal_recordings_dir': '/var/lib/automata-portal/recordings',
+    'terminal_recording_compression': 'gzip',  # None, 'gzip' or 'zstd'
+    'terminal_viewer_window': 262144,  # Unacked bytes a watcher may queue before it is resynced
+    'terminal_viewer_snapshot': 65536,  # Recent output sent to (re)paint a watcher's screen
+    'terminal_input_max_queued': 1024 * 1024,  # Input bytes a session queues while the shell is busy
+    'terminal_paste_chunk': 16384,  # Bytes per terminal_paste message from the page
+    'terminal_paste_window': 4,  # Paste chunks a page may send ahead of the shell reading them
+    'terminal_connection_window': 262144,  # Unacked output bytes per connection, shared by its tabs
+    'terminal_screen_mode': True,  # Clients may ask for screen diffs instead of raw output (needs pyte)
+    'terminal_predictive_echo': True,  # Clients may draw keystrokes before the shell echoes them
+    'terminal_echo_delay': 0.05,  # Seconds typed input gets to echo before a prediction is judged
+    'terminal_probe_interval': 5  # Seconds between the page's latency probes (0 turns them off)
+}
+
+
+def load_config():
+    """Load configuration from tunnel setup"""
+    config_file = '/home/Automata/tunnel-config.txt'
+    if os.path.exists(config_file):
+        with open(config_file, 'r') as f:
+            for line in f:
+                if line.startswith('CONTROLLER_SERIAL='):
+                    CONFIG['controller_serial'] = line.split('=')[1].strip()
+    else:
+        # Fallback to hostname-based serial
+        hostname = os.uname().nodename
+        CONFIG['controller_serial'] = f"Controller-{hostname}"
+    
+    # Settings the installer writes for the Node server; the environment wins
+    env = {}
+    if os.path.exists(CONFIG['env_file']):
+        with open(CONFIG['env_file'], 'r') as f:
+            for line in f:
+                line = line.strip()
+                if '=' in line and not line.startswith('#'):
+                    key, value = line.split('=', 1)
+                    env[key.strip()] = value.strip()
+    env.update(os.environ)
+    if 'WEATHER_ENABLED' in env:
+        CONFIG['weather_enabled'] = env['WEATHER_ENABLED'] == 'true'
+    CONFIG['location'] = env.get('LOCATION') or CONFIG['location']
+    CONFIG['weather_location'] = env.get('WEATHER_LOCATION', CONFIG['weather_location'])
+    CONFIG['weather_units'] = env.get('WEATHER_UNITS', CONFIG['weather_units'])
+    CONFIG['weather_api_key'] = env.get('OPENWEATHER_API', CONFIG['weather_api_key'])
+    if env.get('WEATHER_UPDATE_INTERVAL', '').isdigit():
+        CONFIG['weather_update_interval'] = int(env['WEATHER_UPDATE_INTERVAL']) / 1000
@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Automata Remote Access Portal - Metrics History
+Fixed-size ring buffers of system metric samples kept in compact typed
+arrays or memory-mapped files, with min/max/avg rollup tiers and
+server-side downsampling for dashboard charts
+"""
+
+import math
+import mmap
+import os
+import struct
+import zlib
+from array import array
+
+# Numeric series recorded for every sample
+FIELDS = ('cpu', 'mem', 'temp', 'disk')
+
+# Rollup records keep min, max and average of every series
+STATS = ('min', 'max', 'avg')
+ROLLUP_FIELDS = tuple(f"{field}_{stat}" for field in FIELDS for stat in STATS)
+
+
+class MetricsRing:
+    """Fixed-capacity ring of timestamped samples
+
+    Timestamps live in an array('d') and each series in its own array('f'),
+    so memory is capacity * (8 + 4 * len(fields)) bytes regardless of load.
+    Missing readings are stored as NaN.
+    """
+
+    def __init__(self, capacity, fields=FIELDS):
+        self.capacity = capacity
+        self.fields = tuple(fields)
+        self.times = array('d', bytes(8 * capacity))
+        self.columns = [array('f', bytes(4 * capacity)) for _ in self.fields]
+        self.head = 0  # Next slot to write
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    def memory_bytes(self):
+        """Bytes held by the sample arrays"""
+        return self.times.itemsize * self.capacity + sum(
+            column.itemsize * self.capacity for column in self.columns)
+
+    def _slot(self, index):
+        """Array slot of the index-th oldest sample"""
+        return (self.head - self.count + index) % self.capacity
+
+    def _time(self, slot):
+        return self.times[slot]
+
+    def _values(self, slot):
+        return [column[slot] for column in self.columns]
+
+    def _store(self, slot, timestamp, values):
+        self.times[slot] = timestamp
+        for column, value in zip(self.columns, values):
+            column[slot] = value
+
+    def append(self, timestamp, values):
+        """Record a sample; values maps field name to a number or None"""
+        if self.count and timestamp < self._time(self._slot(self.count - 1)):
+            # Keep timestamps sorted if the wall clock steps backwards
+            timestamp = self._time(self._slot(self.count - 1))
+
+        slot = self.head
+        self._store(slot, timestamp, [math.nan if values.get(field) is None else values[field]
+                                      for field in self.fields])
+
+        self.head = (slot + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def bisect(self, timestamp):
+        """Index of the first sample at or after timestamp"""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._time(self._slot(mid)) < timestamp:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    def first_time(self):
+        """Timestamp of the oldest sample, or None if empty"""
+        return self._time(self._slot(0)) if self.count else None
+
+    def last_time(self):
+        """Timestamp of the newest sample, or None if empty"""
+        return self._time(self._slot(self.count - 1)) if self.count else None
+
+    def records(self, start, end):
+        """Yield (timestamp, values) for samples in [start, end), oldest first"""
+        for index in range(self.bisect(start), self.bisect(end)):
+            slot = self._slot(index)
+            yield self._time(slot), self._values(slot)
+
+
+class MappedMetricsRing(MetricsRing):
+    """MetricsRing persisted in a fixed-size memory-mapped file
+
+    Layout: a 64-byte header (magic, version, capacity, field count, record
+    size, sequence number of the last committed sample) followed by
+    `capacity` fixed-width records of (seq, crc32, timestamp, values...).
+    Sample n lives in slot (n - 1) % capacity and is written in place; the
+    kernel writes dirty pages back on its own schedule, so there is no
+    per-sample fsync. Reopening only validates the records around the
+    committed sequence, dropping a torn final record.
+    """
+
+    MAGIC = b'AMETRING'
+    VERSION = 1
+    HEADER = struct.Struct('<8sIIIIQ')
+    HEADER_SIZE = 64
+
+    def __init__(self, path, capacity, fields=FIELDS):
+        self.path = path
+        self.capacity = capacity
+        self.fields = tuple(fields)
+        self.record = struct.Struct('<IId' + 'f' * len(self.fields))
+        self.values = struct.Struct('<' + 'f' * len(self.fields))
+        self.seq = 0
+
+        size = self.HEADER_SIZE + self.record.size * capacity
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fresh = os.fstat(fd).st_size != size
+            if fresh:
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, size)
+            self.mm = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+
+        if fresh or not self._header_matches():
+            self._reset()
+        else:
+            self._recover()
+
+    def _header_matches(self):
+        magic, version, capacity, nfields, record_size, _ = self.HEADER.unpack_from(self.mm, 0)
+        return (magic == self.MAGIC and version == self.VERSION and capacity == self.capacity
+                and nfields == len(self.fields) and record_size == self.record.size)
+
+    def _write_header(self):
+        self.HEADER.pack_into(self.mm, 0, self.MAGIC, self.VERSION, self.capacity,
+                              len(self.fields), self.record.size, self.seq)
+
+    def _reset(self):
+        """Start an empty ring (new file or incompatible layout)"""
+        self.mm[:] = bytes(len(self.mm))
+        self.seq = 0
+        self.head = 0
+        self.count = 0
+        self._write_header()
+
+    def _offset(self, slot):
+        return self.HEADER_SIZE + slot * self.record.size
+
+    def _valid(self, seq):
+        """Check that sample seq is fully written in its slot"""
+        offset = self._offset((seq - 1) % self.capacity)
+        stored_seq, crc = struct.unpack_from('<II', self.mm, offset)
+        if stored_seq != seq:
+            return False
+        body = self.mm[offset + 8:offset + self.record.size]
+        return zlib.crc32(body, stored_seq) == crc
+
+    def _recover(self):
+        """Rebuild head/count from the header, tolerating a torn last write"""
+        seq = self.HEADER.unpack_from(self.mm, 0)[5]
+
+        # Record written but header update lost
+        while self._valid(seq + 1):
+            seq += 1
+
+        # Header advanced but record incomplete: drop torn samples and keep
+        # their slots out of the ring until they are overwritten
+        dropped = 0
+        while seq > 0 and dropped < self.capacity and not self._valid(seq):
+            seq -= 1
+            dropped += 1
+
+        self.seq = seq
+        self.head = seq % self.capacity
+        self.count = min(seq, self.capacity - dropped)
+        self._write_header()
+
+    def _time(self, slot):
+        return struct.unpack_from('<d', self.mm, self._offset(slot) + 8)[0]
+
+    def _values(self, slot):
+        return self.values.unpack_from(self.mm, self._offset(slot) + 16)
+
+    def _store(self, slot, timestamp, values):
+        seq = self.seq + 1
+        offset = self._offset(slot)
+        self.record.pack_into(self.mm, offset, seq, 0, timestamp, *values)
+        crc = zlib.crc32(self.mm[offset + 8:offset + self.record.size], seq)
+        struct.pack_into('<I', self.mm, offset + 4, crc)
+        self.seq = seq
+        self._write_header()
+
+    def memory_bytes(self):
+        """Bytes of the mapped file"""
+        return len(self.mm)
+
+    def close(self):
+        """Flush dirty pages and unmap"""
+        self.mm.flush()
+        self.mm.close()
+
+
+def open_ring(path, capacity, fields=FIELDS):
+    """Open a persistent ring at path, falling back to memory if unavailable"""
+    if path:
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            return MappedMetricsRing(path, capacity, fields)
+        except OSError as e:
+            print(f"Metrics history not persisted ({path}): {e}")
+    return MetricsRing(capacity, fields)
+
+
+class RollupTier:
+    """Fixed-resolution min/max/avg aggregates, maintained as samples arrive
+
+    The bucket in progress is kept in memory and written to the ring as a
+    single record once a sample from a later bucket arrives.
+    """
+
+    def __init__(self, resolution, ring):
+        self.resolution = resolution
+        self.ring = ring
+        self.bucket = None
+        self._reset_accumulators()
+
+    def _reset_accumulators(self):
+        self.mins = [math.inf] * len(FIELDS)
+        self.maxs = [-math.inf] * len(FIELDS)
+        self.sums = [0.0] * len(FIELDS)
+        self.counts = [0] * len(FIELDS)
+
+    def add(self, timestamp, values):
+        """Fold one raw sample (sequence aligned with FIELDS) into the tier"""
+        bucket = math.floor(timestamp / self.resolution) * self.resolution
+        if bucket != self.bucket:
+            self.flush()
+            self.bucket = bucket
+        for i, value in enumerate(values):
+            if value is None or value != value:
+                continue
+            self.mins[i] = min(self.mins[i], value)
+            self.maxs[i] = max(self.maxs[i], value)
+            self.sums[i] += value
+            self.counts[i] += 1
+
+    def flush(self):
+        """Write the bucket in progress to the ring"""
+        if self.bucket is None:
+            return
+        record = {}
+        for i, field in enumerate(FIELDS):
+            if self.counts[i]:
+                record[f"{field}_min"] = self.mins[i]
+                record[f"{field}_max"] = self.maxs[i]
+                record[f"{field}_avg"] = self.sums[i] / self.counts[i]
+        self.ring.append(self.bucket, record)
+        self.bucket = None
+        self._reset_accumulators()
+
+
+class MetricsHistory:
+    """Raw sample ring plus coarser rollup tiers for long-range queries"""
+
+    def __init__(self, raw, resolution, tiers):
+        self.raw = raw
+        self.resolution = resolution
+        self.tiers = sorted(tiers, key=lambda tier: tier.resolution)
+
+        # Rebuild the buckets that were in progress when the portal stopped
+        for tier in self.tiers:
+            last = tier.ring.last_time()
+            resume = last + tier.resolution if last is not None else -math.inf
+            for timestamp, values in raw.records(resume, math.inf):
+                tier.add(timestamp, values)
+
+    def append(self, timestamp, values):
+        """Record a sample (mapping of field name to value) in every tier"""
+        self.raw.append(timestamp, values)
+        ordered = [values.get(field) for field in FIELDS]
+        for tier in self.tiers:
+            tier.add(timestamp, ordered)
+
+    def select(self, start, step):
+        """Pick the storage for a query: (resolution, ring, is_rollup)
+
+        Uses the coarsest tier no coarser than step, moving to coarser
+        tiers only when the chosen one no longer holds data from start.
+        """
+        levels = [(self.resolution, self.raw, False)] + [
+            (tier.resolution, tier.ring, True) for tier in self.tiers]
+        chosen = 0
+        for i, (resolution, _, _) in enumerate(levels):
+            if resolution <= step:
+                chosen = i
+        while chosen < len(levels) - 1:
+            oldest = levels[chosen][1].first_time()
+            if oldest is not None and oldest <= start:
+                break
+            if not len(levels[chosen + 1][1]):
+                break
+            chosen += 1
+        return levels[chosen]
+
+    def query(self, start, end, step):
+        """Downsample [start, end) into step-second buckets
+
+        Returns {'resolution', 'step', 'series'} where series holds 'time'
+        plus <field>, <field>_min and <field>_max lists, one entry per
+        non-empty bucket aligned to multiples of step.
+        """
+        resolution, ring, rollup = self.select(start, step)
+        step = max(step, resolution)
+
+        series = {'time': []}
+        for field in FIELDS:
+            for suffix in ('', '_min', '_max'):
+                series[field + suffix] = []
+
+        bucket = None
+        mins = maxs = sums = counts = None
+
+        def flush():
+            series['time'].append(bucket)
+            for i, field in enumerate(FIELDS):
+                if counts[i]:
+                    series[field].append(round(sums[i] / counts[i], 2))
+                    series[field + '_min'].append(round(mins[i], 2))
+                    series[field + '_max'].append(round(maxs[i], 2))
+                else:
+                    for suffix in ('', '_min', '_max'):
+                        series[field + suffix].append(None)
+
+        for timestamp, values in ring.records(start, end):
+            record_bucket = math.floor(timestamp / step) * step
+            if record_bucket != bucket:
+                if bucket is not None:
+                    flush()
+                bucket = record_bucket
+                mins = [math.inf] * len(FIELDS)
+                maxs = [-math.inf] * len(FIELDS)
+                sums = [0.0] * len(FIELDS)
+                counts = [0] * len(FIELDS)
+            for i in range(len(FIELDS)):
+                if rollup:
+                    low, high, mean = values[3 * i:3 * i + 3]
+                else:
+                    low = high = mean = values[i]
+                if mean != mean:  # Skip NaN
+                    continue
+                mins[i] = min(mins[i], low)
+                maxs[i] = max(maxs[i], high)
+                sums[i] += mean
+                counts[i] += 1
+
+        if bucket is not None:
+            flush()
+        return {'resolution': resolution, 'step': step, 'series': series}
+
+
+def open_history(directory, resolution, raw_seconds, rollups):
+    """Open (or create) the raw ring and rollup tiers under directory
+
+    rollups is a list of (resolution, retention) pairs in seconds.
+    """
+    def path(name):
+        return os.path.join(directory, name) if directory else None
+
+    raw = open_ring(path('metrics-raw.ring'), int(raw_seconds / resolution))
+    tiers = [RollupTier(tier_resolution,
+                        open_ring(path(f"metrics-{tier_resolution}s.ring"),
+                                  int(retention / tier_resolution), ROLLUP_FIELDS))
+             for tier_resolution, retention in rollups]
+    return MetricsHistory(raw, resolution, tiers)
@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+"""
+Automata Remote Access Portal - Metrics Snapshots
+The latest system metrics snapshot, field-level deltas between snapshots,
+the sample history and the /metrics stream subscribers; the servers take
+the samples and emit what this decides to push
+"""
+
+import json
+import math
+import secrets
+import time
+from collections import namedtuple
+from datetime import datetime
+from types import MappingProxyType
+
+from collector import SystemCollector
+from config import CONFIG
+from history import open_history
+
+# Snapshot IDs are '<epoch>-<seq>'; versions maps each field to the seq in
+# which it last changed, so deltas need no history of older snapshots.
+MetricsSnapshot = namedtuple('MetricsSnapshot',
+                             ['id', 'seq', 'base', 'data', 'body', 'status', 'versions'])
+
+
+class MetricsPublisher:
+    """Latest metrics snapshot, replaced wholesale by the background sampler
+
+    Requests only read the snapshot reference, so they never spawn
+    processes themselves. service_monitor is refreshed with start_task
+    (see ServiceMonitor.start_refresh) when its cached states expire.
+    terminal_latency() supplies the keystroke latency summary pushed with
+    every sample to subscribers that ask for it.
+    """
+
+    def __init__(self, service_monitor, start_task=None, terminal_latency=None):
+        self.collector = SystemCollector()
+        self.service_monitor = service_monitor
+        self.start_task = start_task
+        self.terminal_latency = terminal_latency
+        self.epoch = secrets.token_hex(4)
+        self.snapshot = None
+        self.history = None
+        self.started = False
+
+        # Stream subscribers: sid -> {'interval', 'last_sent', 'sent' (snapshot id),
+        # 'terminal_latency' (opted in to latency pushes)}
+        self.subscribers = {}
+
+    def describe(self, info):
+        """Add service states and identity to a collector sample"""
+        # Service states come from the cache; an expired one is refreshed in
+        # the background and shows up in the next sample
+        if self.service_monitor.due():
+            self.service_monitor.start_refresh(self.start_task)
+
+        info.update({
+            'serial': CONFIG['controller_serial'],
+            'services': self.service_monitor.summary(),
+            'service_states': self.service_monitor.cached,
+            'timestamp': datetime.now().isoformat()
+        })
+        return info
+
+    def open_history(self):
+        """Open the sample history (blocking file I/O)"""
+        self.history = open_history(CONFIG['metrics_history_dir'], CONFIG['metrics_interval'],
+                                    CONFIG['metrics_raw_seconds'], CONFIG['metrics_rollups'])
+
+    def publish(self, data, status=200):
+        """Publish a sample (or an error body) as the current snapshot"""
+        if status == 200 and self.history is not None:
+            self.history.append(time.time(), self.collector.readings)
+
+        previous = self.snapshot
+        seq = previous.seq + 1 if previous else 1
+        if previous and previous.status == status and previous.versions.keys() == data.keys():
+            base = previous.base
+            versions = {key: previous.versions[key] if previous.data[key] == value else seq
+                        for key, value in data.items()}
+        else:
+            # Field set changed, so older snapshots can't be patched forward
+            base = seq
+            versions = dict.fromkeys(data, seq)
+
+        snapshot_id = f"{self.epoch}-{seq}"
+        data['snapshot_id'] = snapshot_id
+
+        # Freeze and pre-serialize once so every request shares the same bytes
+        self.snapshot = MetricsSnapshot(snapshot_id, seq, base, MappingProxyType(data),
+                                        json.dumps(data), status, MappingProxyType(versions))
+        return self.snapshot
+
+    def delta(self, snapshot, since_id):
+        """Fields changed since snapshot since_id, or None if a full snapshot is needed"""
+        epoch, _, seq = (since_id or '').partition('-')
+        if epoch != self.epoch or not seq.isdigit() or snapshot.status != 200:
+            return None
+        seq = int(seq)
+        if seq < snapshot.base or seq > snapshot.seq:
+            return None
+        return {key: snapshot.data[key]
+                for key, version in snapshot.versions.items() if version > seq}
+
+    def subscribe(self, sid, data, snapshot):
+        """Subscribe sid at its requested rate; returns the (event, payload) to send now
+
+        The current state goes out right away so the page doesn't wait a
+        full interval; a reconnecting client that names its last snapshot
+        gets a delta. {'terminal_latency': true} also opts in to the
+        terminal_latency event.
+        """
+        try:
+            interval = float(data.get('interval', CONFIG['metrics_interval']))
+        except (TypeError, ValueError):
+            interval = CONFIG['metrics_interval']
+        interval = min(max(interval, CONFIG['metrics_interval']), CONFIG['metrics_max_push_interval'])
+
+        self.subscribers[sid] = {
+            'interval': interval,
+            'last_sent': time.monotonic(),
+            'sent': snapshot.id,
+            'terminal_latency': bool(data.get('terminal_latency'))
+        }
+
+        changed = self.delta(snapshot, data.get('since'))
+        if changed is None:
+            return 'metrics', dict(snapshot.data)
+        return 'metrics_delta', {'snapshot_id': snapshot.id, 'since': data['since'],
+                                 'changed': changed}
+
+    def unsubscribe(self, sid):
+        """Stop pushes to sid"""
+        self.subscribers.pop(sid, None)
+
+    def pushes(self, snapshot):
+        """(event, payload, sids) for every subscriber whose interval has elapsed
+
+        Clients sharing a base snapshot get the same payload, so the
+        server encodes it once for all of them. Subscribers that opted in
+        also get terminal_latency every sample, whatever their interval.
+        """
+        # Half a sample of slack so sampler jitter doesn't skip a due push
+        now = time.monotonic() + CONFIG['metrics_interval'] / 2
+        deltas = {}
+        groups = {}
+        latency_sids = []
+        for sid, sub in list(self.subscribers.items()):
+            if sub['terminal_latency']:
+                latency_sids.append(sid)
+            if now - sub['last_sent'] < sub['interval']:
+                continue
+            since = sub['sent']
+            if since not in deltas:
+                deltas[since] = self.delta(snapshot, since)
+            changed = deltas[since]
+            if changed is not None and not changed.keys() - {'timestamp'}:
+                continue  # Nothing but the sample time moved
+            sub['last_sent'] = now
+            sub['sent'] = snapshot.id
+            groups.setdefault(since if changed is not None else None, []).append(sid)
+
+        pushes = []
+        for since, sids in groups.items():
+            if since is None:
+                pushes.append(('metrics', dict(snapshot.data), sids))
+            else:
+                pushes.append(('metrics_delta', {
+                    'snapshot_id': snapshot.id,
+                    'since': since,
+                    'changed': deltas[since]
+                }, sids))
+        if latency_sids and self.terminal_latency is not None:
+            pushes.append(('terminal_latency', self.terminal_latency(), latency_sids))
+        return pushes
+
+    def query(self, args):
+        """Answer a history query: ?from=&to= (epoch seconds) &step= (seconds)
+
+        Returns (body, status). Each series comes with _min/_max
+        companions; 'resolution' reports the storage tier (raw samples or
+        a rollup) the answer was built from.
+        """
+        try:
+            end = float(args.get('to', time.time()))
+            start = float(args.get('from', end - 3600))
+            step = float(args['step']) if 'step' in args else (end - start) / 300
+        except ValueError:
+            return {'error': 'from, to and step must be numbers'}, 400
+        if not all(map(math.isfinite, (start, end, step))):
+            return {'error': 'from, to and step must be finite'}, 400
+        if end <= start:
+            return {'error': 'to must be after from'}, 400
+        if step <= 0:
+            return {'error': 'step must be positive'}, 400
+
+        # Never return more points than a chart needs; the history picks the
+        # coarsest rollup tier that still satisfies the step
+        step = max(step, (end - start) / CONFIG['metrics_history_max_points'])
+
+        result = self.history.query(start, end, step)
+        return {'from': start, 'to': end, **result}, 200
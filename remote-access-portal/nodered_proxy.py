@@ -0,0 +1,334 @@
+#!/usr/bin/env python3
+"""
+Automata Remote Access Portal - Node-RED Proxy
+WSGI middleware that serves Node-RED under a path of the portal, keeping
+the editor's static assets in a memory/disk cache with ETag revalidation
+and passing the /comms websocket straight through
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import socket
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+# Hop-by-hop headers are never forwarded in either direction
+HOP_BY_HOP = {'connection', 'keep-alive', 'proxy-authenticate', 'proxy-authorization',
+              'te', 'trailers', 'transfer-encoding', 'upgrade'}
+
+# Types worth compressing for the trip through the tunnel
+COMPRESSIBLE = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+
+
+def splice(src, dst):
+    """Copy bytes from src to dst until either side closes, then close both ways"""
+    try:
+        while True:
+            data = src.recv(65536)
+            if not data:
+                break
+            dst.sendall(data)
+    except OSError:
+        pass
+    finally:
+        for sock in (src, dst):
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+
+class CachedAsset:
+    """One editor asset as last fetched from Node-RED"""
+
+    def __init__(self, content_type, body, upstream_etag=None, checked_at=None):
+        self.content_type = content_type
+        self.body = body
+        self.etag = '"%s"' % hashlib.sha1(body).hexdigest()[:20]
+        self.upstream_etag = upstream_etag
+        self.checked_at = checked_at or time.time()
+        self.gzipped = None
+        if content_type.startswith(COMPRESSIBLE) and len(body) > 1024:
+            self.gzipped = gzip.compress(body, compresslevel=6)
+
+    @property
+    def size(self):
+        return len(self.body) + len(self.gzipped or b'')
+
+
+class AssetCache:
+    """Editor assets by URL: an LRU in memory backed by files on disk
+
+    The disk copy lets a restarted portal revalidate instead of pulling
+    every asset from Node-RED again; directory None keeps memory only.
+    """
+
+    def __init__(self, directory=None, max_memory=16 * 1024 * 1024):
+        self.directory = directory
+        self.max_memory = max_memory
+        self.entries = OrderedDict()
+        self.memory = 0
+        self.stats = {'hits': 0, 'misses': 0, 'revalidated': 0, 'not_modified': 0, 'stale': 0}
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode()).hexdigest())
+
+    def _remember(self, key, asset):
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.memory -= old.size
+        self.entries[key] = asset
+        self.memory += asset.size
+        while self.memory > self.max_memory and len(self.entries) > 1:
+            _, evicted = self.entries.popitem(last=False)
+            self.memory -= evicted.size
+
+    def get(self, key):
+        """Cached asset for key, or None"""
+        asset = self.entries.get(key)
+        if asset is not None:
+            self.entries.move_to_end(key)
+            return asset
+        if self.directory is None:
+            return None
+        try:
+            path = self._path(key)
+            with open(path + '.json') as f:
+                meta = json.load(f)
+            with open(path + '.body', 'rb') as f:
+                body = f.read()
+        except (OSError, ValueError):
+            return None
+        if meta.get('key') != key:
+            return None
+        asset = CachedAsset(meta['content_type'], body, meta.get('upstream_etag'),
+                            meta.get('checked_at'))
+        self._remember(key, asset)
+        return asset
+
+    def put(self, key, content_type, body, upstream_etag=None):
+        """Store a fresh copy of an asset"""
+        asset = CachedAsset(content_type, body, upstream_etag)
+        self._remember(key, asset)
+        if self.directory is not None:
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                path = self._path(key)
+                with open(path + '.body', 'wb') as f:
+                    f.write(body)
+                with open(path + '.json', 'w') as f:
+                    json.dump({'key': key, 'content_type': content_type,
+                               'upstream_etag': upstream_etag,
+                               'checked_at': asset.checked_at}, f)
+            except OSError as e:
+                print(f"Node-RED asset not cached on disk ({self.directory}): {e}")
+        return asset
+
+    def status(self):
+        return {'entries': len(self.entries), 'memory_bytes': self.memory,
+                'max_memory': self.max_memory, **self.stats}
+
+
+class NodeRedProxy:
+    """Forwards <prefix>/... to Node-RED, everything else to the wrapped app
+
+    GETs under one of cache_prefixes (the editor's vendor JS, icons and
+    locales) are answered from the AssetCache with the portal's own ETag,
+    so a browser reopening the editor over the tunnel only sends small
+    If-None-Match revalidations. Cached assets are themselves revalidated
+    with Node-RED once they are older than ttl seconds, and served stale
+    if Node-RED cannot be reached. Answers to requests carrying credentials
+    (Authorization or a cookie) are only cached when Node-RED marks them
+    Cache-Control: public, since the cache is shared by every browser.
+    Other requests are streamed through
+    on the shared upstream client's keep-alive connections; websocket
+    upgrades (/comms) become a raw byte tunnel (eventlet only).
+    """
+
+    def __init__(self, app, client, upstream_url, prefix='/node-red', cache=None, ttl=60,
+                 cache_prefixes=(), start_task=None, timeout=30):
+        self.app = app
+        self.client = client
+        self.upstream_url = upstream_url.rstrip('/')
+        upstream = urlsplit(upstream_url)
+        self.host = upstream.hostname
+        self.port = upstream.port or 80
+        self.prefix = prefix.rstrip('/')
+        self.cache = cache
+        self.ttl = ttl
+        self.cache_prefixes = tuple(cache_prefixes)
+        self.start_task = start_task
+        self.timeout = timeout
+
+    def __call__(self, environ, start_response):
+        path = environ.get('PATH_INFO', '')
+        if path != self.prefix and not path.startswith(self.prefix + '/'):
+            return self.app(environ, start_response)
+        if path == self.prefix:
+            # Node-RED's editor uses relative URLs, so it needs the slash
+            start_response('301 Moved Permanently', [('Location', self.prefix + '/')])
+            return [b'']
+
+        target = path[len(self.prefix):]
+        if environ.get('QUERY_STRING'):
+            target += '?' + environ['QUERY_STRING']
+
+        try:
+            if environ.get('HTTP_UPGRADE', '').lower() == 'websocket':
+                return self._tunnel(environ, start_response, target)
+            if (self.cache is not None and environ['REQUEST_METHOD'] == 'GET'
+                    and target.startswith(self.cache_prefixes)):
+                return self._cached(environ, start_response, target)
+            return self._forward(environ, start_response, target)
+        except OSError as e:
+            start_response('502 Bad Gateway', [('Content-Type', 'text/plain')])
+            return [f"Node-RED is not reachable: {e}".encode()]
+
+    def _request_headers(self, environ):
+        """Client headers to send on, plus forwarding information"""
+        headers = {}
+        for key, value in environ.items():
+            if key.startswith('HTTP_'):
+                name = key[5:].replace('_', '-').title()
+                if name.lower() not in HOP_BY_HOP and name != 'Host':
+                    headers[name] = value
+        for key in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            if environ.get(key):
+                headers[key.replace('_', '-').title()] = environ[key]
+        headers['Host'] = f"{self.host}:{self.port}"
+        headers['X-Forwarded-Host'] = environ.get('HTTP_HOST', '')
+        headers['X-Forwarded-Proto'] = environ.get('HTTP_X_FORWARDED_PROTO',
+                                                   environ.get('wsgi.url_scheme', 'http'))
+        forwarded_for = [environ.get('HTTP_X_FORWARDED_FOR'), environ.get('REMOTE_ADDR')]
+        headers['X-Forwarded-For'] = ', '.join(addr for addr in forwarded_for if addr)
+        headers['X-Forwarded-Prefix'] = self.prefix
+        return headers
+
+    def _response_headers(self, response):
+        headers = []
+        for name, value in response.getheaders():
+            lower = name.lower()
+            if lower in HOP_BY_HOP:
+                continue
+            if lower == 'location' and value.startswith('/'):
+                value = self.prefix + value
+            headers.append((name, value))
+        return headers
+
+    def _open(self, method, target, headers, body=None):
+        return self.client.open(method, self.upstream_url + target, headers, body, self.timeout)
+
+    def _forward(self, environ, start_response, target):
+        """Pass a request through, streaming the response back"""
+        length = int(environ.get('CONTENT_LENGTH') or 0)
+        body = environ['wsgi.input'].read(length) if length else None
+        response = self._open(environ['REQUEST_METHOD'], target,
+                              self._request_headers(environ), body)
+        start_response(f"{response.status} {response.reason}", self._response_headers(response))
+
+        def stream():
+            try:
+                while True:
+                    chunk = response.read1(65536)
+                    if not chunk:
+                        break
+                    yield chunk
+            finally:
+                response.close()
+        return stream()
+
+    def _fetch(self, environ, target, asset):
+        """Fetch or revalidate an asset with Node-RED
+
+        Returns (asset to serve, None), or (None, response) when the answer
+        is not cacheable and has to be passed through as is.
+        """
+        headers = self._request_headers(environ)
+        for name in ('If-None-Match', 'If-Modified-Since', 'Accept-Encoding', 'Range'):
+            headers.pop(name, None)
+        if asset is not None and asset.upstream_etag:
+            headers['If-None-Match'] = asset.upstream_etag
+
+        response = self._open('GET', target, headers)
+        if response.status == 304 and asset is not None:
+            response.read()
+            response.close()
+            asset.checked_at = time.time()
+            self.cache.stats['revalidated'] += 1
+            return asset, None
+        cache_control = (response.getheader('Cache-Control') or '').lower()
+        credentials = 'HTTP_AUTHORIZATION' in environ or 'HTTP_COOKIE' in environ
+        if (response.status != 200 or 'no-store' in cache_control or 'private' in cache_control
+                or (credentials and 'public' not in cache_control)):
+            return None, response
+        try:
+            body = response.read()
+        finally:
+            response.close()
+        self.cache.stats['misses'] += 1
+        content_type = response.getheader('Content-Type', 'application/octet-stream')
+        return self.cache.put(target, content_type, body, response.getheader('ETag')), None
+
+    def _cached(self, environ, start_response, target):
+        """Serve an editor asset from the cache, revalidating it when due"""
+        asset = self.cache.get(target)
+        if asset is None or time.time() - asset.checked_at >= self.ttl:
+            try:
+                fetched, passthrough = self._fetch(environ, target, asset)
+            except OSError:
+                if asset is None:
+                    raise
+                fetched, passthrough = asset, None  # Node-RED down; serve what we have
+                self.cache.stats['stale'] += 1
+            if passthrough is not None:
+                start_response(f"{passthrough.status} {passthrough.reason}",
+                               self._response_headers(passthrough))
+                try:
+                    return [passthrough.read()]
+                finally:
+                    passthrough.close()
+            asset = fetched
+        else:
+            self.cache.stats['hits'] += 1
+
+        headers = [('ETag', asset.etag), ('Cache-Control', 'no-cache'),
+                   ('Vary', 'Accept-Encoding')]
+        if asset.etag in environ.get('HTTP_IF_NONE_MATCH', ''):
+            self.cache.stats['not_modified'] += 1
+            start_response('304 Not Modified', headers)
+            return [b'']
+
+        body = asset.body
+        if asset.gzipped is not None and 'gzip' in environ.get('HTTP_ACCEPT_ENCODING', ''):
+            body = asset.gzipped
+            headers.append(('Content-Encoding', 'gzip'))
+        headers += [('Content-Type', asset.content_type), ('Content-Length', str(len(body)))]
+        start_response('200 OK', headers)
+        return [body]
+
+    def _tunnel(self, environ, start_response, target):
+        """Hand a websocket upgrade to Node-RED and splice the two sockets"""
+        if self.client.async_mode != 'eventlet' or 'eventlet.input' not in environ:
+            start_response('501 Not Implemented', [('Content-Type', 'text/plain')])
+            return [b'Node-RED websocket passthrough needs the eventlet server']
+        from eventlet.wsgi import ALREADY_HANDLED
+
+        client = environ['eventlet.input'].get_socket()
+        upstream = self.client.green.socket.create_connection((self.host, self.port),
+                                                              timeout=self.timeout)
+        upstream.settimeout(None)
+
+        # Replay the handshake; Node-RED's 101 (or error) goes back verbatim
+        headers = self._request_headers(environ)
+        headers['Connection'] = 'Upgrade'
+        headers['Upgrade'] = environ['HTTP_UPGRADE']
+        lines = [f"GET {target} HTTP/1.1"] + [f"{name}: {value}" for name, value in headers.items()]
+        upstream.sendall(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+
+        self.start_task(splice, upstream, client)
+        splice(client, upstream)
+        upstream.close()
+        return ALREADY_HANDLED
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Automata Remote Access Portal - PTY Reactor
+One epoll-driven dispatcher for every terminal session's master fd, so
+idle shells cost no CPU and output is handled as soon as it is readable
+"""
+
+import heapq
+import itertools
+import os
+import select
+import threading
+import time
+
+
+class _WaitTimeout(Exception):
+    pass
+
+
+def make_waiter(async_mode):
+    """Return a cooperative wait(fd, timeout) for green-thread servers
+
+    Under eventlet/gevent the epoll fd itself is parked on the hub, so the
+    reactor yields instead of blocking every other green thread. Threading
+    mode returns None and the reactor blocks in epoll.poll() directly.
+    """
+    if async_mode == 'eventlet':
+        from eventlet.hubs import trampoline
+
+        def wait(fd, timeout):
+            try:
+                trampoline(fd, read=True, timeout=timeout, timeout_exc=_WaitTimeout)
+            except _WaitTimeout:
+                pass
+        return wait
+
+    if async_mode and async_mode.startswith('gevent'):
+        from gevent.socket import wait_read
+
+        def wait(fd, timeout):
+            try:
+                wait_read(fd, timeout=timeout)
+            except Exception:
+                pass  # gevent raises socket.timeout on expiry
+        return wait
+
+    return None
+
+
+class Reactor:
+    """Dispatches fd readiness and timers from a single task"""
+
+    def __init__(self, wait=None):
+        self.epoll = select.epoll()
+        self.handlers = {}
+        self.writers = {}
+        self.paused = set()
+        self.watched = set()  # fds currently in the epoll set
+        self.timers = []
+        self.lock = threading.Lock()
+        self.wait = wait
+        self._counter = itertools.count()
+
+        # Self-pipe so registrations and timers can interrupt a wait
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
+        self.epoll.register(self._wake_r, select.EPOLLIN)
+
+    def register(self, fd, callback):
+        """Call callback(fd) from the reactor whenever fd is readable"""
+        self.handlers[fd] = callback
+        self.epoll.register(fd, select.EPOLLIN)
+        self.watched.add(fd)
+
+    def _update(self, fd):
+        mask = 0 if fd in self.paused else select.EPOLLIN
+        if fd in self.writers:
+            mask |= select.EPOLLOUT
+        if not mask:
+            # epoll reports hangups and errors whatever the mask, so a
+            # paused PTY whose shell exited would fire forever; take the
+            # fd out until it is resumed
+            if fd in self.watched:
+                self.epoll.unregister(fd)
+                self.watched.discard(fd)
+        elif fd in self.watched:
+            self.epoll.modify(fd, mask)
+        else:
+            self.epoll.register(fd, mask)
+            self.watched.add(fd)
+
+    def pause(self, fd):
+        """Stop watching fd without forgetting its handler"""
+        if fd in self.handlers:
+            self.paused.add(fd)
+            self._update(fd)
+
+    def resume(self, fd):
+        """Watch fd again after pause()"""
+        if fd in self.handlers:
+            self.paused.discard(fd)
+            self._update(fd)
+            self.wake()
+
+    def add_writer(self, fd, callback):
+        """Also call callback(fd) whenever a registered fd is writable"""
+        if fd in self.handlers:
+            self.writers[fd] = callback
+            self._update(fd)
+            self.wake()
+
+    def remove_writer(self, fd):
+        """Stop watching fd for writability"""
+        if self.writers.pop(fd, None) is not None and fd in self.handlers:
+            self._update(fd)
+
+    def unregister(self, fd):
+        """Forget fd (call before closing it)"""
+        self.writers.pop(fd, None)
+        self.paused.discard(fd)
+        self.handlers.pop(fd, None)
+        if fd in self.watched:
+            self.watched.discard(fd)
+            try:
+                self.epoll.unregister(fd)
+            except (OSError, ValueError):
+                pass
+
+    def call_later(self, delay, callback):
+        """Run callback() after delay seconds; returns a cancellable timer"""
+        timer = [time.monotonic() + delay, next(self._counter), callback]
+        with self.lock:
+            heapq.heappush(self.timers, timer)
+        self.wake()
+        return timer
+
+    def cancel(self, timer):
+        """Cancel a pending call_later() timer"""
+        timer[2] = None
+
+    def wake(self):
+        try:
+            os.write(self._wake_w, b'\0')
+        except BlockingIOError:
+            pass  # Already pending
+
+    def _next_timeout(self):
+        with self.lock:
+            while self.timers and self.timers[0][2] is None:
+                heapq.heappop(self.timers)
+            if not self.timers:
+                return None
+            return max(0.0, self.timers[0][0] - time.monotonic())
+
+    def _run_timers(self):
+        now = time.monotonic()
+        due = []
+        with self.lock:
+            while self.timers and self.timers[0][0] <= now:
+                timer = heapq.heappop(self.timers)
+                if timer[2] is not None:
+                    due.append(timer[2])
+        for callback in due:
+            callback()
+
+    def run_once(self):
+        """Wait for the next fd event or timer and dispatch it"""
+        timeout = self._next_timeout()
+        if self.wait is not None:
+            self.wait(self.epoll.fileno(), timeout)
+            events = self.epoll.poll(0)
+        else:
+            events = self.epoll.poll(-1 if timeout is None else timeout)
+
+        for fd, mask in events:
+            if fd == self._wake_r:
+                try:
+                    while os.read(self._wake_r, 512):
+                        pass
+                except BlockingIOError:
+                    pass
+                continue
+            if mask & select.EPOLLOUT:
+                writer = self.writers.get(fd)
+                if writer is not None:
+                    writer(fd)
+            if mask & ~select.EPOLLOUT and fd not in self.paused:
+                # A paused handler could not read anyway
+                callback = self.handlers.get(fd)
+                if callback is not None:
+                    callback(fd)
+
+        self._run_timers()
+
+    def run(self):
+        """Dispatch forever (run as a background task)"""
+        while True:
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Terminal reactor error: {e}")
+
+
+class LoopReactor:
+    """The Reactor interface on top of a running asyncio event loop
+
+    Used by the asyncio server: fds are watched with the loop's add_reader
+    (epoll under asyncio, libuv under uvloop) and timers are loop handles,
+    so sessions and the shell pool work unchanged. Loop thread only.
+    """
+
+    def __init__(self, loop):
+        self.loop = loop
+        self.handlers = {}
+
+    def register(self, fd, callback):
+        """Call callback(fd) from the loop whenever fd is readable"""
+        self.handlers[fd] = callback
+        self.loop.add_reader(fd, callback, fd)
+
+    def pause(self, fd):
+        """Stop watching fd without forgetting its handler"""
+        if fd in self.handlers:
+            self.loop.remove_reader(fd)
+
+    def resume(self, fd):
+        """Watch fd again after pause()"""
+        callback = self.handlers.get(fd)
+        if callback is not None:
+            self.loop.add_reader(fd, callback, fd)
+
+    def add_writer(self, fd, callback):
+        """Also call callback(fd) whenever a registered fd is writable"""
+        if fd in self.handlers:
+            self.loop.add_writer(fd, callback, fd)
+
+    def remove_writer(self, fd):
+        """Stop watching fd for writability"""
+        self.loop.remove_writer(fd)
+
+    def unregister(self, fd):
+        """Forget fd (call before closing it)"""
+        if self.handlers.pop(fd, None) is not None:
+            self.loop.remove_reader(fd)
+            self.loop.remove_writer(fd)
+
+    def call_later(self, delay, callback):
+        """Run callback() after delay seconds; returns a cancellable timer"""
+        return self.loop.call_later(delay, callback)
+
+    def cancel(self, timer):
+        """Cancel a pending call_later() timer"""
+        timer.cancel()
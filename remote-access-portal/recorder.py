@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Automata Remote Access Portal - Terminal Session Recorder
+Appends terminal output to per-session asciicast v2 files for audit and
+support replay, compressing and writing from a background thread
+"""
+
+import codecs
+import gzip
+import io
+import json
+import os
+import queue
+import threading
+import time
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+EXTENSIONS = {None: '.cast', 'gzip': '.cast.gz', 'zstd': '.cast.zst'}
+
+
+class RecordingWriter(threading.Thread):
+    """One OS thread that encodes, compresses and writes recording blocks
+
+    The portal runs eventlet without monkey patching, so file I/O and
+    compression done on the hub would stall every terminal; here they
+    happen on a real thread and the PTY path only queues raw frames.
+    """
+
+    def __init__(self):
+        super().__init__(name='terminal-recorder', daemon=True)
+        self.queue = queue.SimpleQueue()
+
+    def submit(self, recorder, events, final=False):
+        self.queue.put((recorder, events, final))
+
+    def run(self):
+        while True:
+            recorder, events, final = self.queue.get()
+            try:
+                recorder.write_block(events)
+                if final:
+                    recorder.file.close()
+            except Exception as e:
+                print(f"Terminal recording error ({recorder.path}): {e}")
+
+
+class SessionRecorder:
+    """Streaming asciicast v2 recording of one terminal session
+
+    Events are buffered in memory and handed to the writer thread once
+    block_size output bytes or flush_interval seconds have accumulated.
+    With compression each block is written as its own gzip member or zstd
+    frame, so the file stays readable up to the last complete block even
+    if the portal is killed mid-session.
+    """
+
+    def __init__(self, path, writer, width, height, compression=None,
+                 block_size=65536, flush_interval=5):
+        self.path = path
+        self.writer = writer
+        self.compression = compression
+        self.block_size = block_size
+        self.flush_interval = flush_interval
+        self.started = time.monotonic()
+        self.pending = []
+        self.pending_bytes = 0
+        self.last_flush = self.started
+        self.closed = False
+
+        # Only touched by the writer thread after construction
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        self.file = open(path, 'ab')
+        self.header = {
+            'version': 2,
+            'width': width,
+            'height': height,
+            'timestamp': int(time.time()),
+            'env': {'SHELL': '/bin/bash', 'TERM': 'xterm-256color'}
+        }
+
+    def output(self, data):
+        """Record a frame of PTY output"""
+        self._add((time.monotonic() - self.started, 'o', data))
+        self.pending_bytes += len(data)
+        if self.pending_bytes >= self.block_size:
+            self.flush()
+
+    def resize(self, cols, rows):
+        """Record a terminal size change"""
+        self._add((time.monotonic() - self.started, 'r', f"{cols}x{rows}"))
+
+    def _add(self, event):
+        if not self.closed:
+            self.pending.append(event)
+
+    def flush_due(self):
+        """True if buffered events have waited flush_interval seconds"""
+        return bool(self.pending) and time.monotonic() - self.last_flush >= self.flush_interval
+
+    def flush(self):
+        """Hand buffered events to the writer thread"""
+        if self.pending and not self.closed:
+            self.writer.submit(self, self.pending)
+            self.pending = []
+            self.pending_bytes = 0
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        """Queue what is left; the writer thread then closes the file"""
+        if self.closed:
+            return
+        self.writer.submit(self, self.pending, final=True)
+        self.pending = []
+        self.closed = True
+
+    def write_block(self, events):
+        """Encode and append events (writer thread)"""
+        lines = []
+        if self.header is not None:
+            lines.append(json.dumps(self.header))
+            self.header = None
+        for elapsed, kind, data in events:
+            if kind == 'o':
+                data = self.decoder.decode(data)
+            lines.append(json.dumps([round(elapsed, 6), kind, data]))
+        if not lines:
+            return
+
+        block = ('\n'.join(lines) + '\n').encode()
+        if self.compression == 'gzip':
+            block = gzip.compress(block, compresslevel=6)
+        elif self.compression == 'zstd':
+            block = zstandard.ZstdCompressor(level=3).compress(block)
+        self.file.write(block)
+        self.file.flush()
+
+
+def open_recording(path):
+    """Text stream over a (possibly compressed) recording, read lazily"""
+    if path.endswith('.gz'):
+        return gzip.open(path, 'rt', encoding='utf-8')
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise OSError('zstandard is not installed')
+        reader = zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'),
+                                                            read_across_frames=True)
+        return io.TextIOWrapper(reader, encoding='utf-8')
+    return open(path, encoding='utf-8')
+
+
+def replay(path, speed=1.0, max_gap=2.0):
+    """Yield (delay, text) output chunks from a recording
+
+    delay is the pause before the chunk at the given speed, with idle
+    gaps capped at max_gap seconds. Only one line is held at a time, so
+    long recordings stream in constant memory.
+    """
+    previous = 0.0
+    with open_recording(path) as f:
+        f.readline()  # Header
+        for line in f:
+            try:
+                elapsed, kind, data = json.loads(line)
+            except ValueError:
+                break  # Truncated tail of an interrupted recording
+            if kind != 'o':
+                continue
+            delay = min(max(elapsed - previous, 0.0), max_gap) / speed
+            previous = elapsed
+            yield delay, data
+
+
+class Recordings:
+    """Directory of session recordings and the shared writer thread"""
+
+    def __init__(self, directory, compression='gzip'):
+        if compression == 'zstd' and zstandard is None:
+            print("zstandard not installed; compressing terminal recordings with gzip")
+            compression = 'gzip'
+        self.directory = directory
+        self.compression = compression
+        self.writer = None
+
+    def start(self, pid, width, height):
+        """New SessionRecorder for a shell, or None if recording is unavailable"""
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            name = f"{time.strftime('%Y%m%d-%H%M%S')}-{pid}{EXTENSIONS[self.compression]}"
+            if self.writer is None:
+                self.writer = RecordingWriter()
+                self.writer.start()
+            return SessionRecorder(os.path.join(self.directory, name), self.writer,
+                                   width, height, self.compression)
+        except OSError as e:
+            print(f"Terminal session not recorded ({self.directory}): {e}")
+            return None
+
+    def list(self):
+        """Recordings, newest first"""
+        try:
+            entries = [entry for entry in os.scandir(self.directory)
+                       if entry.is_file() and '.cast' in entry.name]
+        except OSError:
+            return []
+        entries.sort(key=lambda entry: entry.name, reverse=True)
+        return [{'name': entry.name,
+                 'size': entry.stat().st_size,
+                 'modified': int(entry.stat().st_mtime)} for entry in entries]
+
+    def path(self, name):
+        """Full path of a recording by name, or None if there is no such file"""
+        if name != os.path.basename(name) or '.cast' not in name:
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.isfile(path) else None
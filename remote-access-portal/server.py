@@ -6,47 +6,64 @@ Styled to match Neural Nexus application
 Version: 1.0.0
 """
 
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, Response, render_template, request, jsonify, send_file, session, redirect, url_for
 from flask_socketio import SocketIO, emit
-import subprocess
 import os
-import pty
-import select
-import termios
-import struct
-import fcntl
-import json
 import base64
 import secrets
+import time
 from datetime import datetime
 
+from config import CONFIG, load_config
+from metrics import MetricsPublisher
+from nodered_proxy import AssetCache, NodeRedProxy
+from reactor import Reactor, make_waiter
+from recorder import replay
+from service_health import ServiceMonitor
+from terminal_service import TerminalService
+from upstream import UpstreamClient
+from weather import DISABLED, UNAVAILABLE, WeatherCache, WeatherUnavailable, openweather_fetcher
+
 app = Flask(__name__)
 app.config['SECRET_KEY'] = secrets.token_hex(32)
 socketio = SocketIO(app, cors_allowed_origins="*")
 
-# Store terminal sessions
-terminals = {}
-
-# Configuration
-CONFIG = {
-    'node_red_url': 'http://127.0.0.1:1880',
-    'neural_bms_url': 'https://neuralbms.automatacontrols.com',
-    'controller_serial': None,  # Will be loaded from config file
-    'portal_port': 8000
-}
-
-def load_config():
-    """Load configuration from tunnel setup"""
-    config_file = '/home/Automata/tunnel-config.txt'
-    if os.path.exists(config_file):
-        with open(config_file, 'r') as f:
-            for line in f:
-                if line.startswith('CONTROLLER_SERIAL='):
-                    CONFIG['controller_serial'] = line.split('=')[1].strip()
-    else:
-        # Fallback to hostname-based serial
-        hostname = os.uname().nodename
-        CONFIG['controller_serial'] = f"Controller-{hostname}"
+# Weather lookups shared by every browser (created once config is loaded)
+weather_cache = None
+
+# systemd unit states, probed in one batched call off the request path
+service_monitor = ServiceMonitor(CONFIG['monitored_services'],
+                                 ttl=CONFIG['service_check_ttl'],
+                                 timeout=CONFIG['service_check_timeout'])
+
+def start_terminal_reactor():
+    """Dispatch every terminal's PTY from one background task"""
+    reactor = Reactor(make_waiter(socketio.async_mode))
+    socketio.start_background_task(target=reactor.run)
+    return reactor
+
+# Terminal sessions, driven by the Socket.IO handlers below
+terminals = TerminalService(lambda event, data, to: socketio.emit(event, data, to=to),
+                            start_terminal_reactor, socketio.start_background_task)
+
+# Latest system metrics, replaced wholesale by the background sampler
+metrics = MetricsPublisher(service_monitor, terminal_latency=terminals.registry.latency_summary)
+
+# Keep-alive connections shared by every call to Node-RED, the BMS and weather
+upstream = UpstreamClient(socketio.async_mode,
+                          max_per_host=CONFIG['upstream_max_per_host'],
+                          timeout=CONFIG['upstream_timeout'],
+                          retries=CONFIG['upstream_retries'])
+
+# Node-RED under the portal's own origin, editor assets served from a cache
+nodered_cache = AssetCache(CONFIG['nodered_cache_dir'], CONFIG['nodered_cache_memory'])
+if CONFIG['nodered_proxy_path']:
+    app.wsgi_app = NodeRedProxy(app.wsgi_app, upstream, CONFIG['node_red_url'],
+                                prefix=CONFIG['nodered_proxy_path'],
+                                cache=nodered_cache,
+                                ttl=CONFIG['nodered_cache_ttl'],
+                                cache_prefixes=CONFIG['nodered_cache_prefixes'],
+                                start_task=socketio.start_background_task)
 
 @app.route('/')
 def index():
@@ -58,8 +75,11 @@ def index():
 @app.route('/nodered')
 def nodered():
     """Node-RED iframe page"""
+    node_red_url = CONFIG['node_red_url']
+    if CONFIG['nodered_proxy_path']:
+        node_red_url = CONFIG['nodered_proxy_path'] + '/'
     return render_template('nodered.html', 
-                         node_red_url=CONFIG['node_red_url'],
+                         node_red_url=node_red_url,
                          serial=CONFIG['controller_serial'])
 
 @app.route('/terminal')
@@ -75,152 +95,245 @@ def neuralbms():
                          neural_bms_url=CONFIG['neural_bms_url'],
                          serial=CONFIG['controller_serial'])
 
-@app.route('/api/system-info')
-def system_info():
-    """Get system information"""
+def sample_metrics():
+    """Take one metrics sample and publish it as the current snapshot"""
     try:
-        # Get CPU info
-        cpu_temp = subprocess.check_output(['vcgencmd', 'measure_temp'], text=True).strip().split('=')[1]
-        cpu_usage = subprocess.check_output(['top', '-bn1'], text=True)
-        cpu_percent = float([line for line in cpu_usage.split('\n') if 'Cpu(s)' in line][0].split()[1])
-        
-        # Get memory info
-        mem_info = subprocess.check_output(['free', '-m'], text=True).split('\n')[1].split()
-        mem_total = int(mem_info[1])
-        mem_used = int(mem_info[2])
-        mem_percent = round((mem_used / mem_total) * 100, 1)
-        
-        # Get disk info
-        disk_info = subprocess.check_output(['df', '-h', '/'], text=True).split('\n')[1].split()
-        disk_used = disk_info[2]
-        disk_percent = disk_info[4]
-        
-        # Get network info
-        hostname = os.uname().nodename
-        try:
-            ip_addr = subprocess.check_output(['hostname', '-I'], text=True).split()[0]
-        except:
-            ip_addr = '127.0.0.1'
-        
-        # Check services
-        services = {}
-        for service in ['nodered', 'cloudflared']:
-            try:
-                status = subprocess.check_output(['systemctl', 'is-active', service], text=True).strip()
-                services[service] = status == 'active'
-            except:
-                services[service] = False
-        
-        return jsonify({
-            'cpu_temp': cpu_temp,
-            'cpu_usage': cpu_percent,
-            'mem_total': mem_total,
-            'mem_used': mem_used,
-            'mem_percent': mem_percent,
-            'disk_used': disk_used,
-            'disk_percent': disk_percent,
-            'hostname': hostname,
-            'ip_address': ip_addr,
-            'serial': CONFIG['controller_serial'],
-            'services': services,
-            'timestamp': datetime.now().isoformat()
-        })
+        data, status = metrics.describe(metrics.collector.sample()), 200
     except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        data, status = {'error': str(e)}, 500
+    return metrics.publish(data, status)
 
-# Terminal WebSocket handlers
-@socketio.on('terminal_connect')
-def handle_terminal_connect(data):
-    """Initialize a new terminal session"""
-    session_id = request.sid
-    
-    if session_id in terminals:
+def broadcast_metrics(snapshot):
+    """Push changes to every subscriber whose interval has elapsed"""
+    for event, payload, sids in metrics.pushes(snapshot):
+        socketio.emit(event, payload, to=sids, namespace='/metrics')
+
+def metrics_sampler():
+    """Background task to refresh the metrics snapshot on a fixed interval"""
+    while True:
+        started = time.monotonic()
+        broadcast_metrics(sample_metrics())
+        elapsed = time.monotonic() - started
+        socketio.sleep(max(0, CONFIG['metrics_interval'] - elapsed))
+
+def start_metrics_sampler():
+    """Start the metrics sampler once per process"""
+    if metrics.started:
         return
+    metrics.started = True
+    service_monitor.start_refresh()
+    metrics.open_history()
+    socketio.start_background_task(target=metrics_sampler)
+
+def current_snapshot():
+    """Latest metrics snapshot, sampling synchronously if none exists yet"""
+    snapshot = metrics.snapshot
+    if snapshot is None:
+        # Sampler not running yet (e.g. app imported by another server)
+        start_metrics_sampler()
+        snapshot = metrics.snapshot or sample_metrics()
+    return snapshot
+
+@app.route('/api/system-info')
+def system_info():
+    """Get system information from the latest metrics snapshot
     
-    # Create pseudo terminal
-    master_fd, slave_fd = pty.openpty()
+    With ?since=<snapshot_id> only the fields changed after that snapshot
+    are returned; unknown or expired IDs get the full snapshot.
+    """
+    snapshot = current_snapshot()
+    since = request.args.get('since')
+    if since:
+        changed = metrics.delta(snapshot, since)
+        if changed is not None:
+            return jsonify({'snapshot_id': snapshot.id, 'since': since, 'changed': changed})
     
-    # Start bash process
-    p = subprocess.Popen(
-        ['/bin/bash'],
-        stdin=slave_fd,
-        stdout=slave_fd,
-        stderr=slave_fd,
-        preexec_fn=os.setsid
-    )
+    return app.response_class(snapshot.body, status=snapshot.status,
+                              mimetype='application/json')
+
+@app.route('/api/services')
+def services_status():
+    """Monitored systemd units with cache age and probe counters"""
+    return jsonify(service_monitor.status())
+
+@app.route('/api/nodered/cache')
+def nodered_cache_status():
+    """Node-RED asset cache size and hit/revalidation counters"""
+    return jsonify(nodered_cache.status())
+
+@app.route('/api/upstream')
+def upstream_status():
+    """Upstream connection pool usage and retry counters"""
+    return jsonify(upstream.status())
+
+@app.route('/api/weather')
+def weather():
+    """Current conditions for the configured location, from the shared cache"""
+    if not CONFIG['weather_enabled']:
+        return jsonify(dict(DISABLED, location=CONFIG['location']))
+    try:
+        data, age = get_weather_cache().get(CONFIG['weather_location'], CONFIG['weather_units'])
+    except WeatherUnavailable:
+        return jsonify(UNAVAILABLE)
+    response = jsonify(data)
+    response.headers['Age'] = str(int(age))
+    return response
+
+@app.route('/api/weather/cache')
+def weather_cache_status():
+    """Weather entries with their age and upstream lookup counters"""
+    return jsonify(get_weather_cache().status())
+
+@app.route('/api/terminal/pool')
+def terminal_pool_status():
+    """Warm shell pool counters and startup-to-first-prompt latency"""
+    return jsonify(terminals.get_pool().status())
+
+@app.route('/api/terminal/latency')
+def terminal_latency():
+    """Keystroke latency per session: page to server, shell, server to page"""
+    return jsonify(terminals.registry.latency())
+
+@app.route('/api/admin/terminals')
+def admin_terminals():
+    """Open terminal sessions with traffic, CPU time and memory of each shell"""
+    return jsonify(terminals.registry.stats())
+
+@app.route('/api/admin/terminals/<int:pid>', methods=['DELETE'])
+def admin_close_terminal(pid):
+    """Force-close the terminal session whose shell has this PID"""
+    for term in terminals.registry:
+        if term.process.pid == pid:
+            terminals.end_session(term, 'closed by administrator')
+            return jsonify({'closed': pid})
+    return jsonify({'error': 'No such terminal session'}), 404
+
+@app.route('/api/terminal/recordings')
+def terminal_recordings():
+    """List recorded terminal sessions, newest first"""
+    return jsonify({'recordings': terminals.recordings.list()})
+
+@app.route('/api/terminal/recordings/<name>')
+def terminal_recording_download(name):
+    """Download a recording (asciicast v2, possibly gzip/zstd compressed)"""
+    path = terminals.recordings.path(name)
+    if path is None:
+        return jsonify({'error': 'No such recording'}), 404
+    return send_file(path, as_attachment=True)
+
+@app.route('/api/terminal/recordings/<name>/replay')
+def terminal_recording_replay(name):
+    """Stream a recording's output in real time; ?speed= speeds it up
     
-    terminals[session_id] = {
-        'master_fd': master_fd,
-        'slave_fd': slave_fd,
-        'process': p
-    }
+    Idle gaps are capped at ?max_gap= seconds (default 2).
+    """
+    path = terminals.recordings.path(name)
+    if path is None:
+        return jsonify({'error': 'No such recording'}), 404
+    try:
+        speed = min(max(float(request.args.get('speed', 1)), 0.1), 100)
+        max_gap = max(float(request.args.get('max_gap', 2)), 0)
+    except ValueError:
+        return jsonify({'error': 'speed and max_gap must be numbers'}), 400
     
-    # Set terminal size
-    if 'cols' in data and 'rows' in data:
-        handle_terminal_resize({
-            'cols': data['cols'],
-            'rows': data['rows']
-        })
+    def stream():
+        for delay, data in replay(path, speed, max_gap):
+            if delay:
+                socketio.sleep(delay)
+            yield data
     
-    # Start reading output
-    socketio.start_background_task(target=read_terminal_output, session_id=session_id)
+    return Response(stream(), mimetype='text/plain; charset=utf-8',
+                    headers={'X-Accel-Buffering': 'no', 'Cache-Control': 'no-cache'})
+
+@app.route('/terminal/replay/<name>')
+def terminal_replay(name):
+    """Play a recording back in xterm"""
+    if terminals.recordings.path(name) is None:
+        return jsonify({'error': 'No such recording'}), 404
+    return render_template('replay.html', name=name,
+                           speed=request.args.get('speed', 1),
+                           serial=CONFIG['controller_serial'])
+
+@app.route('/api/metrics/history')
+def metrics_history_query():
+    """Downsampled metric history: ?from=&to= (epoch seconds) &step= (seconds)
     
-    emit('terminal_output', {'data': f'Connected to {CONFIG["controller_serial"]}\r\n'})
+    Each series comes with _min/_max companions; 'resolution' reports the
+    storage tier (raw samples or a rollup) the answer was built from.
+    """
+    start_metrics_sampler()
+    body, status = metrics.query(request.args)
+    return jsonify(body), status
+
+# Metrics stream handlers
+@socketio.on('subscribe', namespace='/metrics')
+def handle_metrics_subscribe(data=None):
+    """Subscribe to metrics pushes at the client's requested rate"""
+    emit(*metrics.subscribe(request.sid, data or {}, current_snapshot()))
+
+@socketio.on('unsubscribe', namespace='/metrics')
+def handle_metrics_unsubscribe(data=None):
+    """Stop metrics pushes for this client"""
+    metrics.unsubscribe(request.sid)
+
+@socketio.on('disconnect', namespace='/metrics')
+def handle_metrics_disconnect():
+    """Forget metrics subscribers on disconnect"""
+    metrics.unsubscribe(request.sid)
+
+# Terminal WebSocket handlers (see TerminalService for the protocol)
+@socketio.on('terminal_connect')
+def handle_terminal_connect(data):
+    terminals.connect(request.sid, data)
+
+@socketio.on('terminal_watch')
+def handle_terminal_watch(data):
+    terminals.watch(request.sid, data)
 
 @socketio.on('terminal_input')
-def handle_terminal_input(data):
-    """Handle terminal input from client"""
-    session_id = request.sid
-    
-    if session_id not in terminals:
-        return
-    
-    master_fd = terminals[session_id]['master_fd']
-    os.write(master_fd, data['data'].encode())
+def handle_terminal_input(data, channel=None):
+    terminals.input(request.sid, data, channel)
+
+@socketio.on('terminal_paste')
+def handle_terminal_paste(data):
+    terminals.paste(request.sid, data)
+
+@socketio.on('terminal_ack')
+def handle_terminal_ack(data):
+    terminals.ack(request.sid, data)
 
 @socketio.on('terminal_resize')
 def handle_terminal_resize(data):
-    """Handle terminal resize"""
-    session_id = request.sid
-    
-    if session_id not in terminals:
-        return
-    
-    master_fd = terminals[session_id]['master_fd']
-    
-    # Set terminal window size
-    winsize = struct.pack('HHHH', data['rows'], data['cols'], 0, 0)
-    fcntl.ioctl(master_fd, termios.TIOCSWINSZ, winsize)
+    terminals.resize(request.sid, data)
+
+@socketio.on('terminal_screen_ack')
+def handle_terminal_screen_ack(data):
+    terminals.screen_ack(request.sid, data)
+
+@socketio.on('terminal_probe')
+def handle_terminal_probe(data):
+    terminals.probe(request.sid, data)
+
+@socketio.on('terminal_probe_result')
+def handle_terminal_probe_result(data):
+    terminals.probe_result(request.sid, data)
+
+@socketio.on('terminal_close')
+def handle_terminal_close(data=None):
+    terminals.close(request.sid, data)
 
 @socketio.on('disconnect')
 def handle_disconnect():
-    """Clean up terminal session on disconnect"""
-    session_id = request.sid
-    
-    if session_id in terminals:
-        term = terminals[session_id]
-        term['process'].terminate()
-        os.close(term['master_fd'])
-        os.close(term['slave_fd'])
-        del terminals[session_id]
-
-def read_terminal_output(session_id):
-    """Background task to read terminal output"""
-    if session_id not in terminals:
-        return
-    
-    master_fd = terminals[session_id]['master_fd']
-    
-    while session_id in terminals:
-        try:
-            # Check if data is available
-            ready, _, _ = select.select([master_fd], [], [], 0.1)
-            
-            if ready:
-                output = os.read(master_fd, 1024).decode('utf-8', errors='replace')
-                socketio.emit('terminal_output', {'data': output}, room=session_id)
-        except:
-            break
+    terminals.disconnect(request.sid)
+
+def get_weather_cache():
+    """Create the weather cache once load_config has read the update interval"""
+    global weather_cache
+    if weather_cache is None:
+        fetch = openweather_fetcher(upstream, CONFIG['weather_api_url'], CONFIG['weather_api_key'])
+        weather_cache = WeatherCache(fetch, socketio.start_background_task, upstream.green.Event,
+                                     interval=CONFIG['weather_update_interval'])
+    return weather_cache
 
 if __name__ == '__main__':
     # Load configuration
@@ -233,5 +346,11 @@ if __name__ == '__main__':
     print(f"Starting Automata Remote Access Portal on port {CONFIG['portal_port']}")
     print(f"Controller Serial: {CONFIG['controller_serial']}")
     
+    # Sample system metrics in the background instead of per request
+    start_metrics_sampler()
+    
+    # Spawn warm shells now so the first terminal opens instantly
+    terminals.get_pool()
+    
     # Run the server
     socketio.run(app, host='0.0.0.0', port=CONFIG['portal_port'], debug=False)
\ No newline at end of file
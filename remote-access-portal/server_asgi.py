@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Automata Remote Access Portal - asyncio Server
+The same routes, Socket.IO events and templates as server.py, served from
+an asyncio event loop (ASGI under uvicorn) instead of Flask on eventlet.
+Subprocesses, file I/O and upstream calls are awaited or run on worker
+threads, so a slow systemctl, disk read or weather lookup never holds up
+terminal traffic. Node-RED is framed from node_red_url directly: the
+cached /node-red proxy (and /api/nodered/cache) is server.py only.
+Usage: python3 server_asgi.py [--port PORT] [--loop auto|asyncio|uvloop]
+"""
+
+import argparse
+import asyncio
+import contextlib
+import os
+import threading
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+import jinja2
+import socketio
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import FileResponse, HTMLResponse, JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from starlette.staticfiles import StaticFiles
+
+from config import CONFIG, load_config
+from metrics import MetricsPublisher
+from reactor import LoopReactor
+from recorder import replay
+from service_health import ServiceMonitor
+from terminal_service import TerminalService
+from upstream import UpstreamClient
+from weather import DISABLED, UNAVAILABLE, WeatherCache, WeatherUnavailable, openweather_fetcher
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*')
+templates = jinja2.Environment(
+    loader=jinja2.FileSystemLoader(os.path.join(BASE_DIR, 'templates')),
+    autoescape=jinja2.select_autoescape(['html'])
+)
+
+# systemd unit states, probed in one batched call off the request path
+service_monitor = ServiceMonitor(CONFIG['monitored_services'],
+                                 ttl=CONFIG['service_check_ttl'],
+                                 timeout=CONFIG['service_check_timeout'])
+
+# Keep-alive connections for weather lookups; the client blocks, so it is
+# only called from worker threads
+upstream = UpstreamClient(max_per_host=CONFIG['upstream_max_per_host'],
+                          timeout=CONFIG['upstream_timeout'],
+                          retries=CONFIG['upstream_retries'])
+
+# Weather lookups shared by every browser (created once config is loaded)
+weather_cache = None
+
+def render_template(name, endpoint, **context):
+    """Render a page; the shared nav highlights the current request.endpoint"""
+    page = templates.get_template(name).render(request=SimpleNamespace(endpoint=endpoint), **context)
+    return HTMLResponse(page)
+
+def send(event, data, to, namespace='/'):
+    """Emit without awaiting, from reactor callbacks and terminal handlers
+
+    Emits are queued as tasks in call order, so terminal output and control
+    events reach a client in the same order as under server.py.
+    """
+    sio.start_background_task(sio.emit, event, data, to=to, namespace=namespace)
+
+# Terminal sessions, with PTY fds watched by the event loop itself. Shell
+# pool refills run as loop callbacks: spawning a shell is one fork/exec,
+# and the pool's fds must be registered from the loop thread
+terminals = TerminalService(send, lambda: LoopReactor(asyncio.get_running_loop()),
+                            lambda task: asyncio.get_running_loop().call_soon(task))
+
+# Latest system metrics snapshot, refreshed by the sampler task
+metrics = MetricsPublisher(service_monitor, sio.start_background_task,
+                           terminals.registry.latency_summary)
+
+async def index(request):
+    """Main dashboard page"""
+    return render_template('dashboard.html', 'index',
+                           serial=CONFIG['controller_serial'],
+                           timestamp=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+
+async def nodered(request):
+    """Node-RED iframe page"""
+    return render_template('nodered.html', 'nodered',
+                           node_red_url=CONFIG['node_red_url'],
+                           serial=CONFIG['controller_serial'])
+
+async def terminal(request):
+    """Terminal page"""
+    return render_template('terminal.html', 'terminal',
+                           serial=CONFIG['controller_serial'])
+
+async def neuralbms(request):
+    """Neural BMS iframe page"""
+    return render_template('neuralbms.html', 'neuralbms',
+                           neural_bms_url=CONFIG['neural_bms_url'],
+                           serial=CONFIG['controller_serial'])
+
+async def sample_metrics():
+    """Take one metrics sample and publish it as the current snapshot"""
+    try:
+        # procfs/sysfs reads and statvfs happen on a worker thread
+        data, status = metrics.describe(await asyncio.to_thread(metrics.collector.sample)), 200
+    except Exception as e:
+        data, status = {'error': str(e)}, 500
+    return metrics.publish(data, status)
+
+async def broadcast_metrics(snapshot):
+    """Push changes to every subscriber whose interval has elapsed"""
+    for event, payload, sids in metrics.pushes(snapshot):
+        await sio.emit(event, payload, to=sids, namespace='/metrics')
+
+async def metrics_sampler():
+    """Background task to refresh the metrics snapshot on a fixed interval"""
+    while True:
+        started = time.monotonic()
+        await broadcast_metrics(await sample_metrics())
+        elapsed = time.monotonic() - started
+        await asyncio.sleep(max(0, CONFIG['metrics_interval'] - elapsed))
+
+async def start_metrics_sampler():
+    """Start the metrics sampler once per process"""
+    if metrics.started:
+        return
+    metrics.started = True
+    service_monitor.start_refresh(sio.start_background_task)
+    await asyncio.to_thread(metrics.open_history)
+    sio.start_background_task(metrics_sampler)
+
+async def current_snapshot():
+    """Latest metrics snapshot, sampling now if none exists yet"""
+    snapshot = metrics.snapshot
+    if snapshot is None:
+        await start_metrics_sampler()
+        snapshot = metrics.snapshot or await sample_metrics()
+    return snapshot
+
+async def system_info(request):
+    """Get system information from the latest metrics snapshot
+
+    With ?since=<snapshot_id> only the fields changed after that snapshot
+    are returned; unknown or expired IDs get the full snapshot.
+    """
+    snapshot = await current_snapshot()
+    since = request.query_params.get('since')
+    if since:
+        changed = metrics.delta(snapshot, since)
+        if changed is not None:
+            return JSONResponse({'snapshot_id': snapshot.id, 'since': since, 'changed': changed})
+
+    return Response(snapshot.body, status_code=snapshot.status, media_type='application/json')
+
+async def services_status(request):
+    """Monitored systemd units with cache age and probe counters"""
+    return JSONResponse(service_monitor.status())
+
+async def upstream_status(request):
+    """Upstream connection pool usage and retry counters"""
+    return JSONResponse(upstream.status())
+
+async def weather(request):
+    """Current conditions for the configured location, from the shared cache"""
+    if not CONFIG['weather_enabled']:
+        return JSONResponse(dict(DISABLED, location=CONFIG['location']))
+    try:
+        # Only a first lookup waits on the upstream; refreshes run behind it
+        data, age = await asyncio.to_thread(get_weather_cache().get, CONFIG['weather_location'],
+                                            CONFIG['weather_units'])
+    except WeatherUnavailable:
+        return JSONResponse(UNAVAILABLE)
+    return JSONResponse(data, headers={'Age': str(int(age))})
+
+async def weather_cache_status(request):
+    """Weather entries with their age and upstream lookup counters"""
+    return JSONResponse(get_weather_cache().status())
+
+async def terminal_pool_status(request):
+    """Warm shell pool counters and startup-to-first-prompt latency"""
+    return JSONResponse(terminals.get_pool().status())
+
+async def terminal_latency(request):
+    """Keystroke latency per session: page to server, shell, server to page"""
+    return JSONResponse(terminals.registry.latency())
+
+async def admin_terminals(request):
+    """Open terminal sessions with traffic, CPU time and memory of each shell"""
+    # Scans every /proc/<pid>/stat, so keep it off the loop
+    return JSONResponse(await asyncio.to_thread(terminals.registry.stats))
+
+async def admin_close_terminal(request):
+    """Force-close the terminal session whose shell has this PID"""
+    pid = request.path_params['pid']
+    for term in terminals.registry:
+        if term.process.pid == pid:
+            terminals.end_session(term, 'closed by administrator')
+            return JSONResponse({'closed': pid})
+    return JSONResponse({'error': 'No such terminal session'}, status_code=404)
+
+async def terminal_recordings(request):
+    """List recorded terminal sessions, newest first"""
+    return JSONResponse({'recordings': await asyncio.to_thread(terminals.recordings.list)})
+
+async def terminal_recording_download(request):
+    """Download a recording (asciicast v2, possibly gzip/zstd compressed)"""
+    name = request.path_params['name']
+    path = await asyncio.to_thread(terminals.recordings.path, name)
+    if path is None:
+        return JSONResponse({'error': 'No such recording'}, status_code=404)
+    return FileResponse(path, filename=name)
+
+async def terminal_recording_replay(request):
+    """Stream a recording's output in real time; ?speed= speeds it up
+
+    Idle gaps are capped at ?max_gap= seconds (default 2).
+    """
+    path = await asyncio.to_thread(terminals.recordings.path, request.path_params['name'])
+    if path is None:
+        return JSONResponse({'error': 'No such recording'}, status_code=404)
+    try:
+        speed = min(max(float(request.query_params.get('speed', 1)), 0.1), 100)
+        max_gap = max(float(request.query_params.get('max_gap', 2)), 0)
+    except ValueError:
+        return JSONResponse({'error': 'speed and max_gap must be numbers'}, status_code=400)
+
+    async def stream():
+        # Reading and decompressing happen on a worker thread, one line at a time
+        chunks = replay(path, speed, max_gap)
+        try:
+            while True:
+                chunk = await asyncio.to_thread(next, chunks, None)
+                if chunk is None:
+                    break
+                delay, data = chunk
+                if delay:
+                    await asyncio.sleep(delay)
+                yield data
+        finally:
+            chunks.close()
+
+    return StreamingResponse(stream(), media_type='text/plain; charset=utf-8',
+                             headers={'X-Accel-Buffering': 'no', 'Cache-Control': 'no-cache'})
+
+async def terminal_replay(request):
+    """Play a recording back in xterm"""
+    name = request.path_params['name']
+    if await asyncio.to_thread(terminals.recordings.path, name) is None:
+        return JSONResponse({'error': 'No such recording'}, status_code=404)
+    return render_template('replay.html', 'terminal_replay', name=name,
+                           speed=request.query_params.get('speed', 1),
+                           serial=CONFIG['controller_serial'])
+
+async def metrics_history_query(request):
+    """Downsampled metric history: ?from=&to= (epoch seconds) &step= (seconds)
+
+    Each series comes with _min/_max companions; 'resolution' reports the
+    storage tier (raw samples or a rollup) the answer was built from.
+    """
+    await start_metrics_sampler()
+    body, status = metrics.query(request.query_params)
+    return JSONResponse(body, status_code=status)
+
+# Metrics stream handlers
+@sio.on('subscribe', namespace='/metrics')
+async def handle_metrics_subscribe(sid, data=None):
+    """Subscribe to metrics pushes at the client's requested rate"""
+    event, payload = metrics.subscribe(sid, data or {}, await current_snapshot())
+    await sio.emit(event, payload, to=sid, namespace='/metrics')
+
+@sio.on('unsubscribe', namespace='/metrics')
+async def handle_metrics_unsubscribe(sid, data=None):
+    """Stop metrics pushes for this client"""
+    metrics.unsubscribe(sid)
+
+@sio.on('disconnect', namespace='/metrics')
+async def handle_metrics_disconnect(sid):
+    """Forget metrics subscribers on disconnect"""
+    metrics.unsubscribe(sid)
+
+# Terminal WebSocket handlers (see TerminalService for the protocol)
+@sio.on('terminal_connect')
+async def handle_terminal_connect(sid, data):
+    terminals.connect(sid, data)
+
+@sio.on('terminal_watch')
+async def handle_terminal_watch(sid, data):
+    terminals.watch(sid, data)
+
+@sio.on('terminal_input')
+async def handle_terminal_input(sid, data, channel=None):
+    terminals.input(sid, data, channel)
+
+@sio.on('terminal_paste')
+async def handle_terminal_paste(sid, data):
+    terminals.paste(sid, data)
+
+@sio.on('terminal_ack')
+async def handle_terminal_ack(sid, data):
+    terminals.ack(sid, data)
+
+@sio.on('terminal_resize')
+async def handle_terminal_resize(sid, data):
+    terminals.resize(sid, data)
+
+@sio.on('terminal_screen_ack')
+async def handle_terminal_screen_ack(sid, data):
+    terminals.screen_ack(sid, data)
+
+@sio.on('terminal_probe')
+async def handle_terminal_probe(sid, data):
+    terminals.probe(sid, data)
+
+@sio.on('terminal_probe_result')
+async def handle_terminal_probe_result(sid, data):
+    terminals.probe_result(sid, data)
+
+@sio.on('terminal_close')
+async def handle_terminal_close(sid, data=None):
+    terminals.close(sid, data)
+
+@sio.on('disconnect')
+async def handle_disconnect(sid):
+    terminals.disconnect(sid)
+
+def start_thread(target, *args):
+    """Run a weather refresh on its own OS thread"""
+    threading.Thread(target=target, args=args, name='weather', daemon=True).start()
+
+def get_weather_cache():
+    """Create the weather cache once load_config has read the update interval"""
+    global weather_cache
+    if weather_cache is None:
+        fetch = openweather_fetcher(upstream, CONFIG['weather_api_url'], CONFIG['weather_api_key'])
+        weather_cache = WeatherCache(fetch, start_thread, upstream.green.Event,
+                                     interval=CONFIG['weather_update_interval'])
+    return weather_cache
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    """Start background work once the event loop is running"""
+    # Sample system metrics in the background instead of per request
+    await start_metrics_sampler()
+
+    # Spawn warm shells now so the first terminal opens instantly
+    terminals.get_pool()
+    yield
+
+routes = [
+    Route('/', index),
+    Route('/nodered', nodered),
+    Route('/terminal', terminal),
+    Route('/neuralbms', neuralbms),
+    Route('/api/system-info', system_info),
+    Route('/api/services', services_status),
+    Route('/api/upstream', upstream_status),
+    Route('/api/weather', weather),
+    Route('/api/weather/cache', weather_cache_status),
+    Route('/api/terminal/pool', terminal_pool_status),
+    Route('/api/terminal/latency', terminal_latency),
+    Route('/api/admin/terminals', admin_terminals),
+    Route('/api/admin/terminals/{pid:int}', admin_close_terminal, methods=['DELETE']),
+    Route('/api/terminal/recordings', terminal_recordings),
+    Route('/api/terminal/recordings/{name}', terminal_recording_download),
+    Route('/api/terminal/recordings/{name}/replay', terminal_recording_replay),
+    Route('/terminal/replay/{name}', terminal_replay),
+    Route('/api/metrics/history', metrics_history_query),
+    Mount('/static', StaticFiles(directory=os.path.join(BASE_DIR, 'static'), check_dir=False))
+]
+
+# Socket.IO answers under /socket.io/; everything else goes to Starlette
+app = socketio.ASGIApp(sio, Starlette(routes=routes, lifespan=lifespan))
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Automata Remote Access Portal (asyncio)')
+    parser.add_argument('--port', type=int, default=CONFIG['portal_port'])
+    parser.add_argument('--loop', choices=['auto', 'asyncio', 'uvloop'], default=CONFIG['event_loop'],
+                        help="event loop; 'auto' uses uvloop when it is installed")
+    args = parser.parse_args()
+
+    # Load configuration
+    load_config()
+
+    print(f"Starting Automata Remote Access Portal (asyncio, {args.loop} loop) on port {args.port}")
+    print(f"Controller Serial: {CONFIG['controller_serial']}")
+
+    # Run the server
+    uvicorn.run(app, host='0.0.0.0', port=args.port, loop=args.loop, log_level='warning')
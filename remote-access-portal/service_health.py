@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Automata Remote Access Portal - Service Health
+systemd unit states for the dashboard, fetched for every monitored unit
+in one deadline-bounded `systemctl show` and cached between probes
+"""
+
+import asyncio
+import os
+import signal
+import subprocess
+import threading
+import time
+
+PROPERTIES = ['LoadState', 'ActiveState', 'SubState']
+
+
+def unit_name(service):
+    """systemd unit for a configured service name"""
+    return service if '.' in service else f"{service}.service"
+
+
+def parse_show(output, services):
+    """States per service from `systemctl show` output
+
+    systemctl prints one block of Key=value lines per unit, separated by
+    blank lines, in the order the units were given.
+    """
+    blocks = [block for block in output.strip().split('\n\n') if block.strip()]
+    states = {}
+    for service, block in zip(services, blocks):
+        fields = dict(line.partition('=')[::2] for line in block.splitlines())
+        states[service] = {
+            'active': fields.get('ActiveState') == 'active',
+            'state': fields.get('ActiveState', 'unknown'),
+            'sub': fields.get('SubState', 'unknown'),
+            'loaded': fields.get('LoadState') == 'loaded'
+        }
+    return states
+
+
+class ServiceMonitor:
+    """Cached states of the monitored systemd services
+
+    Readers only ever get the cache, so a hung systemd never blocks a
+    request or the metrics sampler. Once the cache is older than ttl a
+    refresh runs on a background thread (or as a task under asyncio),
+    killing systemctl after timeout seconds; on failure the last known
+    states stay in place, marked stale.
+    """
+
+    def __init__(self, services, ttl=10, timeout=2):
+        self.services = list(services)
+        self.ttl = ttl
+        self.timeout = timeout
+        self.cached = {service: {'active': False, 'state': 'unknown', 'sub': 'unknown',
+                                 'loaded': False} for service in self.services}
+        self.checked_at = None  # monotonic time of the last successful probe
+        self.attempted_at = 0.0
+        self.error = None
+        self.refreshing = False
+        self.stats = {'probes': 0, 'failures': 0, 'last_ms': None}
+
+    @property
+    def command(self):
+        args = ['systemctl', 'show', '--no-pager']
+        for prop in PROPERTIES:
+            args += ['-p', prop]
+        return args + [unit_name(service) for service in self.services]
+
+    def due(self):
+        """True if the cache has expired and no refresh is running"""
+        return not self.refreshing and time.monotonic() - self.attempted_at >= self.ttl
+
+    def _store(self, returncode, output, errors, started):
+        if returncode != 0:
+            # e.g. no systemd on this host; keep the last known states
+            self._fail(errors.strip() or f"systemctl exited with status {returncode}")
+            return
+        self.cached = {**self.cached, **parse_show(output, self.services)}
+        self.checked_at = time.monotonic()
+        self.error = None
+        self.stats['last_ms'] = round((self.checked_at - started) * 1000, 1)
+
+    def _fail(self, error):
+        self.error = error
+        self.stats['failures'] += 1
+
+    def refresh(self):
+        """Probe every unit at once, blocking for at most timeout seconds"""
+        started = self.attempted_at = time.monotonic()
+        self.stats['probes'] += 1
+        try:
+            result = subprocess.run(self.command, capture_output=True, text=True,
+                                    timeout=self.timeout)
+            self._store(result.returncode, result.stdout, result.stderr, started)
+        except subprocess.TimeoutExpired:
+            self._fail(f"systemctl did not answer within {self.timeout}s")
+        except OSError as e:
+            self._fail(str(e))
+        finally:
+            self.refreshing = False
+
+    async def refresh_async(self):
+        """refresh() for the asyncio server, without blocking the loop"""
+        started = self.attempted_at = time.monotonic()
+        self.stats['probes'] += 1
+        process = None
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *self.command, stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE, start_new_session=True)
+            stdout, stderr = await asyncio.wait_for(process.communicate(), self.timeout)
+            self._store(process.returncode, stdout.decode(), stderr.decode(), started)
+        except asyncio.TimeoutError:
+            # Kill the whole group so nothing is left holding the pipes open
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            await process.wait()
+            self._fail(f"systemctl did not answer within {self.timeout}s")
+        except OSError as e:
+            self._fail(str(e))
+        finally:
+            self.refreshing = False
+
+    def start_refresh(self, start_task=None):
+        """Refresh in the background
+
+        With start_task (an asyncio task starter) refresh_async() runs on
+        the loop; otherwise refresh() gets its own OS thread, since the
+        eventlet portal runs without monkey patching and waiting on
+        systemctl from a green thread would stall every terminal.
+        """
+        self.refreshing = True
+        if start_task is not None:
+            start_task(self.refresh_async)
+        else:
+            threading.Thread(target=self.refresh, name='service-health', daemon=True).start()
+
+    def stale(self):
+        """True if the cached states are older than twice the ttl"""
+        return self.checked_at is None or time.monotonic() - self.checked_at > 2 * self.ttl
+
+    def summary(self):
+        """Service name -> running, as the dashboard and tunnel badge expect"""
+        return {service: state['active'] for service, state in self.cached.items()}
+
+    def status(self):
+        """Cache age, probe counters and the last error"""
+        return {
+            'services': self.cached,
+            'age': None if self.checked_at is None else round(time.monotonic() - self.checked_at, 1),
+            'stale': self.stale(),
+            'error': self.error,
+            **self.stats
+        }
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Automata Remote Access Portal - Terminal Session Registry
+Tracks live terminal sessions, enforces session count and lifetime limits,
+reaps exited shells and reports per-session resource usage
+"""
+
+import os
+import signal
+import time
+
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK')
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+
+def hangup(process):
+    """Hang up a shell's whole session, like a real terminal closing"""
+    try:
+        os.killpg(process.pid, signal.SIGHUP)
+    except (ProcessLookupError, PermissionError):
+        pass
+
+
+def process_usage(session_ids):
+    """CPU seconds, RSS bytes and process count per session ID from /proc
+
+    Shells are started with setsid, so a shell's PID is also the session ID
+    shared by every job it runs (each job gets its own process group).
+    CPU includes children the shell has already waited for.
+    """
+    usage = {sid: [0.0, 0, 0] for sid in session_ids}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat', 'rb') as f:
+                stat = f.read()
+        except OSError:
+            continue  # Exited while scanning
+        # comm may contain spaces or parens; fields resume after the last ')'
+        fields = stat[stat.rindex(b')') + 2:].split()
+        totals = usage.get(int(fields[3]))
+        if totals is None:
+            continue
+        ticks = int(fields[11]) + int(fields[12])
+        if int(entry) == int(fields[3]):
+            ticks += int(fields[13]) + int(fields[14])
+        totals[0] += ticks / CLOCK_TICKS
+        totals[1] += int(fields[21]) * PAGE_SIZE
+        totals[2] += 1
+    return usage
+
+
+class SessionRegistry:
+    """Live terminal sessions by token, with limits and child reaping
+
+    Sessions past idle_timeout (no input or output) or max_lifetime are
+    reported by expired(); closed shells are hung up and polled by reap()
+    until they exit, escalating to SIGKILL after kill_grace seconds so
+    neither runaway shells nor zombies accumulate.
+    """
+
+    def __init__(self, max_sessions=8, idle_timeout=4 * 3600, max_lifetime=24 * 3600,
+                 kill_grace=5):
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.max_lifetime = max_lifetime
+        self.kill_grace = kill_grace
+        self.sessions = {}
+        self.retired = []  # [process, deadline for SIGKILL]
+
+    def __len__(self):
+        return len(self.sessions)
+
+    def __contains__(self, token):
+        return token in self.sessions
+
+    def __iter__(self):
+        return iter(list(self.sessions.values()))
+
+    def get(self, token):
+        return self.sessions.get(token) if token else None
+
+    def full(self):
+        return len(self.sessions) >= self.max_sessions
+
+    def add(self, term):
+        self.sessions[term.token] = term
+
+    def remove(self, term):
+        """Forget a session and queue its shell for reaping"""
+        if self.sessions.pop(term.token, None) is not None:
+            self.retire(term.process)
+
+    def retire(self, process):
+        """Hang up a shell and reap it once it exits"""
+        hangup(process)
+        self.retired.append([process, time.monotonic() + self.kill_grace])
+
+    def reap(self):
+        """Collect exited shells; SIGKILL ones that ignored the hangup"""
+        now = time.monotonic()
+        pending = []
+        for entry in self.retired:
+            process, deadline = entry
+            if process.poll() is not None:
+                continue
+            if deadline is not None and now >= deadline:
+                try:
+                    os.killpg(process.pid, signal.SIGKILL)
+                except (ProcessLookupError, PermissionError):
+                    process.kill()
+                entry[1] = None
+            pending.append(entry)
+        self.retired = pending
+
+    def expired(self):
+        """Sessions past their idle or absolute timeout, with the reason"""
+        now = time.monotonic()
+        result = []
+        for term in self:
+            if now - term.created_at >= self.max_lifetime:
+                result.append((term, 'session time limit reached'))
+            elif now - term.last_active >= self.idle_timeout:
+                result.append((term, 'idle timeout'))
+        return result
+
+    def evictable(self):
+        """Longest-idle detached session, to make room for a new one"""
+        detached = [term for term in self if term.sid is None]
+        return min(detached, key=lambda term: term.last_active, default=None)
+
+    def stats(self):
+        """Per-session counters for the admin endpoint"""
+        now = time.monotonic()
+        sessions = list(self)
+        usage = process_usage([term.process.pid for term in sessions])
+        result = []
+        for term in sessions:
+            cpu, rss, processes = usage[term.process.pid]
+            result.append({
+                'pid': term.process.pid,
+                'attached': term.sid is not None,
+                'client': term.sid,
+                'channel': term.channel,
+                'screen': term.screen.stats if term.screen is not None else None,
+                'predict': term.predict,
+                'watch_id': term.watch_id,
+                'viewers': len(term.viewers),
+                'started': term.started,
+                'age': round(now - term.created_at, 1),
+                'idle': round(now - term.last_active, 1),
+                'bytes_in': term.bytes_in,
+                'bytes_out': term.pump.bytes_out,
+                'cpu_seconds': round(cpu, 2),
+                'rss_bytes': rss,
+                'processes': processes
+            })
+        return {
+            'count': len(result),
+            'max_sessions': self.max_sessions,
+            'idle_timeout': self.idle_timeout,
+            'max_lifetime': self.max_lifetime,
+            'reaping': len(self.retired),
+            'sessions': result
+        }
+
+    def latency(self):
+        """Per-session keystroke latency histograms for the latency endpoint"""
+        return {'sessions': [{'pid': term.process.pid,
+                              'attached': term.sid is not None,
+                              'client': term.sid,
+                              'channel': term.channel,
+                              'legs': term.latency.status()}
+                             for term in self]}
+
+    def latency_summary(self):
+        """Keystroke latency histograms for dashboards, without client or process IDs"""
+        return {'sessions': [{'attached': term.sid is not None,
+                              'legs': term.latency.status()}
+                             for term in self]}
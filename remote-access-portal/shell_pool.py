@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Automata Remote Access Portal - Warm Shell Pool
+Keeps a few bash shells spawned on their own PTYs so opening a terminal
+doesn't wait for fork/exec and rc-file processing
+"""
+
+import os
+import pty
+import subprocess
+import time
+from collections import deque
+
+
+def spawn_shell():
+    """Start bash on a new PTY; returns (master_fd, process)"""
+    master_fd, slave_fd = pty.openpty()
+    process = subprocess.Popen(
+        ['/bin/bash'],
+        stdin=slave_fd,
+        stdout=slave_fd,
+        stderr=slave_fd,
+        start_new_session=True
+    )
+    # Only the shell holds the slave side, so its exit shows up as EIO
+    os.close(slave_fd)
+    return master_fd, process
+
+
+class WarmShell:
+    """A spawned shell and whatever it printed before being handed out"""
+
+    def __init__(self, master_fd, process):
+        self.master_fd = master_fd
+        self.process = process
+        self.spawned_at = time.monotonic()
+        self.ready_at = None  # When the first output (the prompt) arrived
+        self.output = bytearray()
+
+
+def summarize(samples):
+    """Latency summary in milliseconds for the pool stats endpoint"""
+    if not samples:
+        return {'count': 0, 'last_ms': None, 'avg_ms': None, 'max_ms': None}
+    return {
+        'count': len(samples),
+        'last_ms': round(samples[-1] * 1000, 1),
+        'avg_ms': round(sum(samples) * 1000 / len(samples), 1),
+        'max_ms': round(max(samples) * 1000, 1)
+    }
+
+
+class ShellPool:
+    """Pool of pre-spawned shells, refilled in the background
+
+    Idle shells are watched on the reactor so their prompt is buffered
+    (and timed) before anyone asks for them. Shells idle longer than
+    max_idle are recycled so long-lived ones don't go stale.
+    """
+
+    MAX_BUFFERED = 65536
+
+    def __init__(self, reactor, start_task, retire, size=2, max_idle=1800):
+        self.reactor = reactor
+        self.start_task = start_task
+        self.retire = retire  # Hangs up and reaps a discarded shell
+        self.size = size
+        self.max_idle = max_idle
+        self.idle = deque()
+        self.refilling = False
+        self.stats = {'hits': 0, 'misses': 0, 'spawned': 0, 'recycled': 0}
+        self.spawn_to_prompt = deque(maxlen=100)
+        self.open_to_prompt = deque(maxlen=100)
+
+    def _watch(self, shell, fd):
+        """Reactor callback: buffer output produced while the shell is idle"""
+        try:
+            chunk = os.read(fd, 4096)
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError:
+            chunk = b''
+        if not chunk:
+            # Shell died while pooled
+            self._discard(shell)
+            return
+
+        if shell.ready_at is None:
+            shell.ready_at = time.monotonic()
+            self.spawn_to_prompt.append(shell.ready_at - shell.spawned_at)
+        if len(shell.output) < self.MAX_BUFFERED:
+            shell.output += chunk
+
+    def _spawn(self):
+        shell = WarmShell(*spawn_shell())
+        self.stats['spawned'] += 1
+        return shell
+
+    def _discard(self, shell):
+        if shell in self.idle:
+            self.idle.remove(shell)
+        self.reactor.unregister(shell.master_fd)
+        os.close(shell.master_fd)
+        self.retire(shell.process)
+
+    def refill(self):
+        """Spawn shells until the pool is full (run as a background task)"""
+        try:
+            while len(self.idle) < self.size:
+                shell = self._spawn()
+                os.set_blocking(shell.master_fd, False)
+                self.idle.append(shell)
+                self.reactor.register(shell.master_fd,
+                                      lambda fd, shell=shell: self._watch(shell, fd))
+        finally:
+            self.refilling = False
+
+    def schedule_refill(self):
+        if self.size > 0 and not self.refilling and len(self.idle) < self.size:
+            self.refilling = True
+            self.start_task(self.refill)
+
+    def acquire(self):
+        """Hand out a warm shell, or spawn one if the pool is empty"""
+        now = time.monotonic()
+        while self.idle:
+            shell = self.idle.popleft()
+            if shell.process.poll() is None and now - shell.spawned_at < self.max_idle:
+                self.reactor.unregister(shell.master_fd)
+                self.stats['hits'] += 1
+                self.schedule_refill()
+                return shell
+            self._discard(shell)
+            self.stats['recycled'] += 1
+
+        self.stats['misses'] += 1
+        self.schedule_refill()
+        return self._spawn()
+
+    def recycle(self):
+        """Replace shells that have sat idle longer than max_idle"""
+        now = time.monotonic()
+        for shell in list(self.idle):
+            if now - shell.spawned_at >= self.max_idle or shell.process.poll() is not None:
+                self._discard(shell)
+                self.stats['recycled'] += 1
+        self.schedule_refill()
+
+    def record_open(self, seconds):
+        """Time from a terminal being requested to its first prompt byte"""
+        self.open_to_prompt.append(seconds)
+
+    def status(self):
+        """Pool size, hit/miss counters and startup latency summaries"""
+        return {
+            'size': self.size,
+            'idle': len(self.idle),
+            'ready': sum(1 for shell in self.idle if shell.ready_at is not None),
+            'max_idle': self.max_idle,
+            **self.stats,
+            'spawn_to_prompt': summarize(self.spawn_to_prompt),
+            'open_to_prompt': summarize(self.open_to_prompt)
+        }
+
+    def close(self):
+        """Terminate all idle shells"""
+        for shell in list(self.idle):
+            self._discard(shell)
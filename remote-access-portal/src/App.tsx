@@ -20,6 +20,7 @@ import NodeRED from './pages/NodeRED';
 import Terminal from './pages/Terminal';
 import NeuralBMS from './pages/NeuralBMS';
 import { authenticatedFetch } from './services/api';
+import { subscribeMetrics } from './services/metrics';
 import { SystemInfo, WeatherData } from './types';
 import './styles/app.css';
 
@@ -29,23 +30,9 @@ const App: React.FC = () => {
   const [weatherData, setWeatherData] = useState<WeatherData | null>(null);
   const [isAuthenticated, setIsAuthenticated] = useState<boolean>(true);
 
-  // Fetch system info
+  // Subscribe to pushed system info
   useEffect(() => {
-    const fetchSystemInfo = async () => {
-      try {
-        const response = await authenticatedFetch('/api/system-info');
-        if (response.ok) {
-          const data = await response.json();
-          setSystemInfo(data);
-        }
-      } catch (error) {
-        console.error('Failed to fetch system info:', error);
-      }
-    };
-
-    fetchSystemInfo();
-    const interval = setInterval(fetchSystemInfo, 5000);
-    return () => clearInterval(interval);
+    return subscribeMetrics(setSystemInfo, 5);
   }, []);
 
   // Fetch weather data
@@ -26,6 +26,7 @@ import {
   Filler
 } from 'chart.js';
 import { SystemInfo } from '../types';
+import { authenticatedFetch } from '../services/api';
 
 ChartJS.register(
   CategoryScale,
@@ -38,14 +39,46 @@ ChartJS.register(
   Filler
 );
 
+const HISTORY_POINTS = 20;
+
 interface DashboardProps {
   systemInfo: SystemInfo | null;
 }
 
 const Dashboard: React.FC<DashboardProps> = ({ systemInfo }) => {
-  const [cpuHistory, setCpuHistory] = useState<number[]>(Array(20).fill(0));
-  const [memHistory, setMemHistory] = useState<number[]>(Array(20).fill(0));
-  const [timeLabels, setTimeLabels] = useState<string[]>(Array(20).fill(''));
+  const [cpuHistory, setCpuHistory] = useState<number[]>(Array(HISTORY_POINTS).fill(0));
+  const [memHistory, setMemHistory] = useState<number[]>(Array(HISTORY_POINTS).fill(0));
+  const [timeLabels, setTimeLabels] = useState<string[]>(Array(HISTORY_POINTS).fill(''));
+
+  // Seed the charts from the server-side history so a reload starts full
+  useEffect(() => {
+    const loadHistory = async () => {
+      try {
+        const to = Date.now() / 1000;
+        const response = await authenticatedFetch(
+          `/api/metrics/history?from=${to - HISTORY_POINTS * 5}&to=${to}&step=5`
+        );
+        if (!response.ok) return;
+        const { series } = await response.json();
+        const pad = (values: (number | null)[], fill: any) =>
+          [...Array(HISTORY_POINTS).fill(fill), ...values.map(v => v ?? 0)].slice(-HISTORY_POINTS);
+
+        setCpuHistory(pad(series.cpu, 0));
+        setMemHistory(pad(series.mem, 0));
+        setTimeLabels([
+          ...Array(HISTORY_POINTS).fill(''),
+          ...series.time.map((t: number) => new Date(t * 1000).toLocaleTimeString('en-US', {
+            hour: '2-digit',
+            minute: '2-digit'
+          }))
+        ].slice(-HISTORY_POINTS));
+      } catch (error) {
+        console.error('Failed to load metrics history:', error);
+      }
+    };
+
+    loadHistory();
+  }, []);
 
   useEffect(() => {
     if (!systemInfo) return;
@@ -0,0 +1,93 @@
+/*
+ * AutomataControls™ Remote Portal
+ * Copyright © 2024 AutomataNexus, LLC. All rights reserved.
+ *
+ * PROPRIETARY AND CONFIDENTIAL
+ * This software is proprietary to AutomataNexus and constitutes valuable
+ * trade secrets. This software may not be copied, distributed, modified,
+ * or disclosed to third parties without prior written authorization from
+ * AutomataNexus. Use of this software is governed by a commercial license
+ * agreement. Unauthorized use is strictly prohibited.
+ *
+ * AutomataNexusBms Controller Software
+ */
+
+import { io } from 'socket.io-client';
+import { authenticatedFetch } from './api';
+import { MetricsDelta, SystemInfo } from '../types';
+
+// Subscribe to pushed system metrics on the /metrics namespace.
+// Falls back to HTTP polling when the backend doesn't offer the stream.
+export const subscribeMetrics = (
+  onData: (data: SystemInfo) => void,
+  intervalSeconds: number = 5
+): (() => void) => {
+  const socket = io('/metrics');
+  let pollTimer: ReturnType<typeof setInterval> | null = null;
+  let state: SystemInfo | null = null;
+
+  // Full snapshots replace the state; deltas patch the snapshot they name
+  const applyUpdate = (update: SystemInfo | MetricsDelta): boolean => {
+    if (!('changed' in update)) {
+      state = update;
+    } else if (state && state.snapshot_id === update.since) {
+      state = { ...state, ...update.changed, snapshot_id: update.snapshot_id };
+    } else {
+      return false;
+    }
+    onData(state);
+    return true;
+  };
+
+  const subscribe = () => {
+    socket.emit('subscribe', {
+      interval: intervalSeconds,
+      since: state ? state.snapshot_id : null
+    });
+  };
+
+  const poll = async () => {
+    try {
+      const since = state ? `?since=${encodeURIComponent(state.snapshot_id || '')}` : '';
+      const response = await authenticatedFetch(`/api/system-info${since}`);
+      if (response.ok && !applyUpdate(await response.json())) {
+        state = null;
+      }
+    } catch (error) {
+      console.error('Failed to fetch system info:', error);
+    }
+  };
+
+  const startPolling = () => {
+    if (pollTimer) return;
+    poll();
+    pollTimer = setInterval(poll, intervalSeconds * 1000);
+  };
+
+  const stopPolling = () => {
+    if (pollTimer) {
+      clearInterval(pollTimer);
+      pollTimer = null;
+    }
+  };
+
+  socket.on('connect', () => {
+    stopPolling();
+    subscribe();
+  });
+  socket.on('metrics', applyUpdate);
+  socket.on('metrics_delta', (delta: MetricsDelta) => {
+    if (!applyUpdate(delta)) {
+      // Missed an update; resubscribe for a full snapshot
+      state = null;
+      subscribe();
+    }
+  });
+  socket.on('connect_error', startPolling);
+
+  return () => {
+    stopPolling();
+    socket.emit('unsubscribe');
+    socket.disconnect();
+  };
+};
@@ -28,6 +28,13 @@ export interface SystemInfo {
   disk_available: string;
   disk_percent: number;
   timestamp: string;
+  snapshot_id?: string;
+}
+
+export interface MetricsDelta {
+  snapshot_id: string;
+  since: string;
+  changed: Partial<SystemInfo>;
 }
 
 export interface WeatherData {
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Automata Remote Access Portal - Terminal Input Writer
+Queues keystrokes and pastes for a PTY and writes them as the shell
+reads, so a large paste neither blocks the server nor gets cut short
+"""
+
+import os
+import time
+from collections import deque
+
+# Bracketed paste (DECSET 2004): the application asks for pastes to be
+# wrapped in these markers so it can tell them from typed input
+BRACKETED_PASTE_ON = b'\x1b[?2004h'
+BRACKETED_PASTE_OFF = b'\x1b[?2004l'
+PASTE_START = b'\x1b[200~'
+PASTE_END = b'\x1b[201~'
+
+INTERRUPT = b'\x03'
+
+
+def strip_paste_markers(data):
+    """Remove paste markers, including any that removing others would join up"""
+    while True:
+        stripped = data.replace(PASTE_END, b'').replace(PASTE_START, b'')
+        if stripped == data:
+            return data
+        data = stripped
+
+
+class Paste:
+    """One paste being written, as offsets into the session's input stream"""
+
+    def __init__(self, paste_id, start, bracketed):
+        self.id = paste_id
+        self.start = start
+        self.end = start
+        self.bracketed = bracketed
+        self.held = b''  # Chunk tail that may start a marker split across chunks
+        self.complete = False  # Client has sent the last chunk
+        self.chunk_ends = deque()  # Stream offset at which each queued chunk is written
+        self.chunks_written = 0
+
+    def advance(self, written):
+        """Count chunks fully written by offset written; True if any were"""
+        before = self.chunks_written
+        while self.chunk_ends and self.chunk_ends[0] <= written:
+            self.chunk_ends.popleft()
+            self.chunks_written += 1
+        return self.chunks_written != before
+
+    @property
+    def done(self):
+        return self.complete and not self.chunk_ends
+
+
+class InputWriter:
+    """Non-blocking input queue for a PTY master
+
+    write() queues data and writes what the PTY will take right away;
+    whatever is left is written by drain() once the master fd is writable
+    again. Keystrokes and pastes share the queue, so typing during a paste
+    stays in order. Pastes arrive in chunks, are wrapped in bracketed
+    paste markers while the application has mode 2004 on, and report how
+    much has been written so the client can keep a bounded amount in
+    flight. A Ctrl+C drops whatever paste input is still queued.
+
+    Typed input is also counted for clients predicting their own echo:
+    echo_ack() says how many typed bytes reached the shell long enough
+    ago that their echo, if any, has been read back.
+    """
+
+    def __init__(self, fd, chunk_size=4096, max_queued=1024 * 1024):
+        self.fd = fd
+        self.chunk_size = chunk_size
+        self.max_queued = max_queued
+        self.queue = bytearray()
+        self.accepted = 0  # Offset just past the last queued byte
+        self.written = 0  # Offset just past the last byte written
+        self.pastes = deque()
+        self.bracketed = False
+        self.cancelled = set()  # Pastes cut short whose remaining chunks are dropped
+        self.closed = False
+        self.typed = 0  # Typed bytes queued since the client attached
+        self.typed_marks = deque()  # (stream offset, typed count) not yet written
+        self.typed_written = deque()  # (time written, typed count) not yet acked
+        self.echoed = 0
+        self._tail = b''  # End of the previous output frame, for split sequences
+
+    @property
+    def pending(self):
+        """Bytes queued but not yet written"""
+        return len(self.queue)
+
+    def observe_output(self, data):
+        """Track bracketed paste mode from the application's output"""
+        data = self._tail + data
+        on = data.rfind(BRACKETED_PASTE_ON)
+        off = data.rfind(BRACKETED_PASTE_OFF)
+        if on != off:
+            self.bracketed = on > off
+        self._tail = data[-(len(BRACKETED_PASTE_ON) - 1):]
+
+    def _queue(self, data):
+        self.queue += data
+        self.accepted += len(data)
+
+    def write(self, data, typed=False):
+        """Queue input; returns ids of pastes a Ctrl+C cancelled
+
+        typed marks keystrokes from the client, counted for echo_ack().
+        """
+        cancelled = []
+        if INTERRUPT in data and self.pastes:
+            cancelled = self.cancel_pastes()
+        self._queue(data)
+        if typed:
+            self.typed += len(data)
+            self.typed_marks.append((self.accepted, self.typed))
+        self.drain()
+        return cancelled
+
+    def paste(self, paste_id, data, final=True):
+        """Queue one chunk of a paste
+
+        Returns False (and queues nothing) if the queue is full; the
+        client is expected to stay within its window, so this only stops
+        a misbehaving one. Chunks of a cancelled paste are dropped.
+        """
+        if paste_id in self.cancelled:
+            if final:
+                self.cancelled.discard(paste_id)
+            return True
+        if len(self.queue) + len(data) > self.max_queued:
+            return False
+        paste = self.pastes[-1] if self.pastes and not self.pastes[-1].complete else None
+        if paste is None or paste.id != paste_id:
+            paste = Paste(paste_id, self.accepted, self.bracketed)
+            self.pastes.append(paste)
+            if paste.bracketed:
+                self._queue(PASTE_START)
+
+        if paste.bracketed:
+            # An end marker inside the text would let it escape the paste.
+            # Markers can be split across chunks, so the end of each chunk
+            # waits for the next one, as in observe_output()
+            data = strip_paste_markers(paste.held + data)
+            paste.held = b''
+            if not final:
+                keep = len(PASTE_END) - 1
+                paste.held = data[-keep:]
+                data = data[:-keep]
+        self._queue(data)
+        if final:
+            if paste.bracketed:
+                self._queue(PASTE_END)
+            paste.complete = True
+        paste.end = self.accepted
+        paste.chunk_ends.append(self.accepted)
+        self.drain()
+        return True
+
+    def cancel_pastes(self):
+        """Drop queued paste input; returns the ids of the cancelled pastes
+
+        Anything typed while a paste was still arriving goes with it;
+        typed input queued after the last paste is kept.
+        """
+        start = max(self.pastes[0].start, self.written) - self.written
+        end = max(self.pastes[-1].end, self.written) - self.written
+        kept = self.queue[:start]
+        if any(paste.bracketed and paste.start < self.written < paste.end
+               for paste in self.pastes):
+            kept += PASTE_END  # Don't leave the application mid-paste
+        kept += self.queue[end:]
+        self.queue = kept
+        self.accepted = self.written + len(kept)
+
+        # Typed bytes dropped with the pastes count as written; their echo
+        # never comes, which is what the client should be told
+        self.typed_marks = deque((min(offset, self.accepted), count)
+                                 for offset, count in self.typed_marks)
+
+        cancelled = [paste.id for paste in self.pastes]
+        self.cancelled.update(paste.id for paste in self.pastes if not paste.complete)
+        self.pastes.clear()
+        return cancelled
+
+    def end_pastes(self):
+        """Close off pastes whose client went away mid-paste
+
+        What arrived is still written; later chunks with the same ids are
+        treated as new pastes.
+        """
+        for paste in self.pastes:
+            if not paste.complete:
+                if paste.bracketed:
+                    self._queue(paste.held + PASTE_END)
+                    paste.held = b''
+                    paste.end = self.accepted
+                    paste.chunk_ends.append(self.accepted)
+                paste.complete = True
+        self.cancelled.clear()
+
+    def drain(self):
+        """Write queued input until the PTY would block; returns bytes written"""
+        total = 0
+        while self.queue and not self.closed:
+            try:
+                count = os.write(self.fd, self.queue[:self.chunk_size])
+            except BlockingIOError:
+                break
+            except OSError:
+                # EIO once the shell has exited
+                self.closed = True
+                self.queue.clear()
+                break
+            del self.queue[:count]
+            self.written += count
+            total += count
+        self._mark_written()
+        return total
+
+    def _mark_written(self):
+        now = time.monotonic()
+        while self.typed_marks and (self.closed or self.typed_marks[0][0] <= self.written):
+            self.typed_written.append((now, self.typed_marks.popleft()[1]))
+
+    def echo_ack(self, delay):
+        """Typed bytes written to the shell at least delay seconds ago"""
+        self._mark_written()
+        cutoff = time.monotonic() - delay
+        while self.typed_written and self.typed_written[0][0] <= cutoff:
+            self.echoed = self.typed_written.popleft()[1]
+        return self.echoed
+
+    @property
+    def echo_pending(self):
+        """True while typed input has not been covered by echo_ack()"""
+        return bool(self.typed_marks or self.typed_written)
+
+    def reset_typed(self):
+        """Start counting typed input over for a new client"""
+        self.typed = 0
+        self.typed_marks.clear()
+        self.typed_written.clear()
+        self.echoed = 0
+
+    def progress(self):
+        """[(paste id, chunks written, done)] for pastes that moved since last asked
+
+        Clients count chunks in flight against these reports; finished
+        pastes are reported with done set and then forgotten.
+        """
+        updates = []
+        for paste in self.pastes:
+            if paste.advance(self.written) or paste.done:
+                updates.append((paste.id, paste.chunks_written, paste.done))
+        while self.pastes and self.pastes[0].done:
+            self.pastes.popleft()
+        return updates
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Automata Remote Access Portal - Terminal Latency Probes
+Per-session histograms of the keystroke path, split into its legs so a
+slow terminal can be blamed on the tunnel, the server or the shell
+"""
+
+import time
+from bisect import bisect_left
+from collections import deque
+
+# Histogram bucket upper bounds in ms: 0.1 ms to ~16 s, about 12% apart
+BOUNDS = [0.1 * 2 ** (i / 6) for i in range(104)]
+
+LEGS = ('up', 'shell', 'down', 'round_trip')
+
+
+class LatencyHistogram:
+    """Latency samples in log-spaced buckets
+
+    Memory stays constant however long a session runs; percentiles are
+    read back as the upper bound of their bucket, so within about 12%.
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BOUNDS) + 1)
+        self.count = 0
+        self.max = 0.0
+
+    def add(self, ms):
+        self.counts[bisect_left(BOUNDS, ms)] += 1
+        self.count += 1
+        self.max = max(self.max, ms)
+
+    def percentile(self, fraction):
+        """Latency in ms that fraction of the samples are at or below"""
+        if not self.count:
+            return None
+        target = fraction * self.count
+        running = 0
+        for bucket, count in enumerate(self.counts):
+            running += count
+            if running >= target:
+                break
+        bound = BOUNDS[bucket] if bucket < len(BOUNDS) else self.max
+        return round(min(bound, self.max), 1)
+
+    def summary(self):
+        return {'count': self.count, 'p50_ms': self.percentile(0.5),
+                'p95_ms': self.percentile(0.95), 'p99_ms': self.percentile(0.99),
+                'max_ms': round(self.max, 1) if self.count else None}
+
+
+class LatencyProbe:
+    """Keystroke latency of one terminal session, by leg
+
+    The page sends a probe every few seconds stamped with its own clock;
+    the server stamps its arrival and its reply, and the page hands all
+    four stamps back once the reply is in, as NTP does. The round trip
+    minus the server's hold time is exact. Splitting it into the up
+    (page to server) and down (server to page) legs needs the offset
+    between the two clocks, taken from the fastest recent probe (the one
+    least delayed by queueing); other probes are measured against it.
+
+    The shell leg is timed on the server alone: from a keystroke arriving
+    to the next output frame being sent, which covers the PTY write, the
+    shell echoing and the output being read and batched. Keystrokes with
+    no output within shell_timeout (a command that prints nothing) are
+    not counted.
+    """
+
+    def __init__(self, window=16, shell_timeout=1.0):
+        self.legs = {leg: LatencyHistogram() for leg in LEGS}
+        self.recent = deque(maxlen=window)  # (round trip, clock offset) per probe
+        self.shell_timeout = shell_timeout
+        self.keystroke_at = None
+
+    def new_client(self):
+        """Forget the clock offset; a different page is attached"""
+        self.recent.clear()
+        self.keystroke_at = None
+
+    def probe(self, sent, received, replied, returned):
+        """Record a probe's four stamps (ms): page sent, server received
+        and replied, page got the reply"""
+        round_trip = (returned - sent) - (replied - received)
+        if round_trip < 0 or replied < received:
+            return  # Nonsense stamps
+        self.recent.append((round_trip, ((received - sent) + (replied - returned)) / 2))
+        offset = min(self.recent)[1]
+        self.legs['round_trip'].add(round_trip)
+        self.legs['up'].add(max(0.0, received - offset - sent))
+        self.legs['down'].add(max(0.0, returned - (replied - offset)))
+
+    def keystroke(self):
+        """A keystroke reached the server; time it to the next output"""
+        if self.keystroke_at is None:
+            self.keystroke_at = time.monotonic()
+
+    def output(self):
+        """An output frame is going out"""
+        if self.keystroke_at is not None:
+            elapsed = time.monotonic() - self.keystroke_at
+            if elapsed <= self.shell_timeout:
+                self.legs['shell'].add(elapsed * 1000)
+            self.keystroke_at = None
+
+    def status(self):
+        return {leg: histogram.summary() for leg, histogram in self.legs.items()}
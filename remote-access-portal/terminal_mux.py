@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Automata Remote Access Portal - Terminal Channel Multiplexer
+Lets one Socket.IO connection carry several terminal sessions (tabs),
+sharing the link fairly between them
+"""
+
+from collections import OrderedDict, deque
+
+
+def channel_args(payload, channel):
+    """Event arguments for a session: tagged with its channel when it has one
+
+    Clients running a single terminal without channels keep getting the
+    bare payload; multiplexed clients get (payload, channel).
+    """
+    return (payload,) if channel is None else (payload, channel)
+
+
+class TerminalMux:
+    """The terminal sessions attached to one Socket.IO connection
+
+    channels maps the client's channel ids to session tokens. Output frames
+    are queued per channel and sent round-robin, one frame per channel per
+    turn, while fewer than window bytes are unacknowledged on the whole
+    connection; a tab flooding output can therefore delay another tab's
+    frame by at most one of its own. Each session's OutputPump still does
+    per-channel flow control, counting frames queued here as unacked, so
+    a noisy tab stops reading its PTY instead of growing this queue.
+    """
+
+    def __init__(self, sid, emit, window=262144):
+        self.sid = sid
+        self.emit = emit  # emit(channel, payload) sends one terminal_output event
+        self.window = window
+        self.channels = {}
+        self.queues = OrderedDict()  # channel -> deque of (payload, size), in turn order
+        self.in_flight = 0
+        self.unacked = {}  # channel -> its share of in_flight
+        self.stats = {'frames': 0, 'bytes': 0, 'queued': 0}
+
+    def send(self, channel, payload, size):
+        """Queue an output frame for a channel and send whatever fits"""
+        queue = self.queues.get(channel)
+        if queue is None:
+            queue = self.queues[channel] = deque()
+        queue.append((payload, size))
+        if self.in_flight >= self.window:
+            self.stats['queued'] += 1
+        self.dispatch()
+
+    def dispatch(self):
+        """Send queued frames round-robin until the window is full"""
+        while self.queues and self.in_flight < self.window:
+            channel, queue = next(iter(self.queues.items()))
+            payload, size = queue.popleft()
+            if queue:
+                self.queues.move_to_end(channel)
+            else:
+                del self.queues[channel]
+            self.in_flight += size
+            self.unacked[channel] = self.unacked.get(channel, 0) + size
+            self.stats['frames'] += 1
+            self.stats['bytes'] += size
+            self.emit(channel, payload)
+
+    def ack(self, channel, size):
+        """The client rendered size bytes of a channel's output"""
+        size = min(size, self.unacked.get(channel, 0))
+        self.unacked[channel] = self.unacked.get(channel, 0) - size
+        self.in_flight -= size
+        self.dispatch()
+
+    def flush(self, channel):
+        """Send a channel's queued frames now, window or not (its session is ending)"""
+        for payload, size in self.queues.pop(channel, ()):
+            self.in_flight += size
+            self.unacked[channel] = self.unacked.get(channel, 0) + size
+            self.emit(channel, payload)
+
+    def drop(self, channel):
+        """Forget a channel that was closed or moved to another connection
+
+        Its frames still in flight may never be acked (the tab is gone), so
+        they stop counting against the window.
+        """
+        self.channels.pop(channel, None)
+        self.queues.pop(channel, None)
+        self.in_flight -= self.unacked.pop(channel, 0)
+        self.dispatch()
+
+    def status(self):
+        return {'channels': len(self.channels), 'in_flight': self.in_flight,
+                'queued_frames': sum(len(queue) for queue in self.queues.values()),
+                **self.stats}
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Automata Remote Access Portal - Terminal Output Pump
+Coalesces PTY output into size/time-bounded frames and stops reading the
+PTY while the client has too many unacknowledged bytes in flight
+"""
+
+import fcntl
+import os
+import time
+
+
+class OutputPump:
+    """Batches reads from a PTY master into frames with backpressure
+
+    Output is sent once frame_size bytes are buffered or frame_delay seconds
+    after the first buffered byte, whichever comes first. Every sent byte
+    counts as unacked until the client acknowledges it; above high_water
+    the pump stops reading, so a slow client leaves data in the kernel's
+    PTY buffer (and eventually blocks the shell) instead of in server
+    memory. Reading resumes once unacked bytes drop to low_water.
+    """
+
+    def __init__(self, fd, send, frame_size=16384, frame_delay=0.01,
+                 high_water=262144, low_water=65536):
+        self.fd = fd
+        self.send = send
+        self.frame_size = frame_size
+        self.frame_delay = frame_delay
+        self.high_water = high_water
+        self.low_water = low_water
+
+        self.buffer = bytearray()
+        self.first_at = None  # When the oldest buffered byte arrived
+        self.last_flush_at = 0.0
+        self.unacked = 0
+        self.paused = False
+        self.closed = False
+        self.bytes_out = 0
+        self.frames_out = 0
+
+        flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+        fcntl.fcntl(fd, fcntl.F_SETFL, flags | os.O_NONBLOCK)
+
+    def read(self):
+        """Drain available PTY output into the frame buffer
+
+        Returns the number of bytes read; sets closed on EOF/EIO.
+        """
+        total = 0
+        interactive = (not self.buffer and
+                       time.monotonic() - self.last_flush_at >= self.frame_delay)
+        while not self.paused and not self.closed:
+            try:
+                chunk = os.read(self.fd, self.frame_size - len(self.buffer))
+            except BlockingIOError:
+                break
+            except OSError:
+                # EIO once the shell exits and the slave side closes
+                self.closed = True
+                break
+            if not chunk:
+                self.closed = True
+                break
+
+            if not self.buffer:
+                self.first_at = time.monotonic()
+            self.buffer += chunk
+            total += len(chunk)
+
+            if len(self.buffer) >= self.frame_size:
+                self.flush()
+
+        if interactive and self.buffer:
+            self.flush()
+        return total
+
+    def flush_delay(self):
+        """Seconds until buffered output is due, or None if nothing is buffered"""
+        if not self.buffer:
+            return None
+        return max(0.0, self.first_at + self.frame_delay - time.monotonic())
+
+    def flush(self):
+        """Send buffered output as one frame"""
+        if not self.buffer:
+            return
+        frame = bytes(self.buffer)
+        self.buffer.clear()
+        self.first_at = None
+        self.last_flush_at = time.monotonic()
+
+        self.unacked += len(frame)
+        self.bytes_out += len(frame)
+        self.frames_out += 1
+        if self.unacked >= self.high_water:
+            self.paused = True
+        self.send(frame)
+
+    def reset_flow(self, inflight=0):
+        """Start flow control over for a new client with inflight bytes sent"""
+        self.unacked = inflight
+        self.paused = self.unacked >= self.high_water
+
+    def ack(self, nbytes):
+        """Client has consumed nbytes of output"""
+        self.unacked = max(0, self.unacked - nbytes)
+        if self.paused and self.unacked <= self.low_water:
+            self.paused = False
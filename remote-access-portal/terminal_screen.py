@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Automata Remote Access Portal - Terminal Screen State
+A virtual screen per session for clients on slow links: they are sent
+the rows that changed since the last update they drew, not every byte
+"""
+
+from collections import deque
+
+try:
+    import pyte
+except ImportError:
+    pyte = None
+
+# SGR codes for pyte's named colours (foreground; background is +10)
+COLORS = {'black': 30, 'red': 31, 'green': 32, 'brown': 33, 'blue': 34,
+          'magenta': 35, 'cyan': 36, 'white': 37}
+COLORS.update({'bright' + name: code + 60 for name, code in COLORS.items()})
+
+# Private modes that change what the client's keyboard and mouse send, so
+# the client's own terminal must follow them: cursor keys, mouse
+# reporting and bracketed paste
+INPUT_MODES = (1, 1000, 1002, 1003, 1006, 2004)
+
+
+def color(value, base):
+    """SGR parameters for one pyte colour ('default', a name, or 'rrggbb')"""
+    if value == 'default':
+        return []
+    if value in COLORS:
+        return [str(COLORS[value] + base - 30)]
+    try:
+        red, green, blue = (int(value[i:i + 2], 16) for i in (0, 2, 4))
+    except ValueError:
+        return []
+    return [str(base + 8), '2', str(red), str(green), str(blue)]
+
+
+def sgr(char):
+    """Escape sequence selecting a cell's colours and attributes"""
+    params = ['0']
+    for flag, code in (('bold', '1'), ('italics', '3'), ('underscore', '4'),
+                       ('blink', '5'), ('reverse', '7'), ('strikethrough', '9')):
+        if getattr(char, flag):
+            params.append(code)
+    params += color(char.fg, 30) + color(char.bg, 40)
+    return '\x1b[' + ';'.join(params) + 'm'
+
+
+class ScreenState:
+    """A session's current screen, sent to its client as row diffs
+
+    The PTY output is fed to a pyte screen, and every row remembers the
+    version in which it last changed. The client acks the version of each
+    update once drawn; the next update holds only the rows changed since
+    then, so a client on a congested link skips intermediate screens and
+    converges on the current one instead of replaying a backlog of stale
+    output. At most one update is in flight. Needs the optional pyte
+    package.
+
+    pyte is pure Python (a few hundred KB/s on a Pi), so output frames
+    wait in pending and are fed one at a time between other work.
+    """
+
+    def __init__(self, cols, rows, respond=None):
+        self.screen = pyte.Screen(cols, rows)
+        if respond is not None:
+            # Device status/attribute queries get answered from here, since
+            # the client's terminal never sees them
+            self.screen.write_process_input = lambda data: respond(data.encode())
+        self.stream = pyte.ByteStream(self.screen)
+        self.pending = deque()  # Output frames not yet fed
+        self.timer = None  # Scheduled feed_next() call
+        self.version = 0
+        self.row_versions = [0] * rows
+        self.acked = None  # Version the client has drawn; None repaints everything
+        self.in_flight = None  # Version sent and not yet acked
+        self.sent_modes = None
+        self.stats = {'updates': 0, 'rows': 0, 'bytes_in': 0, 'bytes_out': 0}
+
+    def feed(self, data):
+        """Apply PTY output to the screen"""
+        self.stream.feed(data)
+        self.stats['bytes_in'] += len(data)
+        self.version += 1
+        for row in self.screen.dirty:
+            if row < len(self.row_versions):
+                self.row_versions[row] = self.version
+        self.screen.dirty.clear()
+
+    def feed_next(self):
+        """Feed the oldest pending frame; returns its size"""
+        if not self.pending:
+            return 0
+        frame = self.pending.popleft()
+        self.feed(frame)
+        return len(frame)
+
+    def resize(self, cols, rows):
+        """Follow a window size change; the client gets a full repaint"""
+        if (cols, rows) == (self.screen.columns, self.screen.lines):
+            return
+        self.screen.resize(rows, cols)
+        self.screen.dirty.clear()
+        self.version += 1
+        self.row_versions = [self.version] * rows
+        self.reset_client()
+
+    def reset_client(self):
+        """A (re)attached client starts from a blank screen"""
+        self.acked = None
+        self.in_flight = None
+        self.sent_modes = None
+
+    @property
+    def due(self):
+        """True if the client is not waiting on an update and is behind"""
+        return self.in_flight is None and (self.acked is None or self.version > self.acked)
+
+    def _render_row(self, row):
+        line = self.screen.buffer[row]
+        parts = [f'\x1b[{row + 1};1H']
+        last = None
+        end = self.screen.columns
+        while end > 0 and line[end - 1] == self.screen.default_char:
+            end -= 1
+        for column in range(end):
+            char = line[column]
+            if not char.data:
+                continue  # Right half of a wide character
+            style = sgr(char)
+            if style != last:
+                parts.append(style)
+                last = style
+            parts.append(char.data)
+        parts.append('\x1b[0m\x1b[K')
+        return ''.join(parts)
+
+    def update(self):
+        """(version, full, escape sequences) bringing the client up to date, or None"""
+        if not self.due:
+            return None
+        full = self.acked is None
+        rows = [row for row, version in enumerate(self.row_versions)
+                if full or version > self.acked]
+
+        parts = ['\x1b[?25l']  # Hide the cursor while rows are drawn
+        modes = {mode for mode in INPUT_MODES if (mode << 5) in self.screen.mode}
+        if modes != self.sent_modes:
+            parts += [f'\x1b[?{mode}{"h" if mode in modes else "l"}' for mode in INPUT_MODES]
+            self.sent_modes = modes
+        parts += [self._render_row(row) for row in rows]
+        cursor = self.screen.cursor
+        parts.append(f'\x1b[{cursor.y + 1};{cursor.x + 1}H')
+        if not cursor.hidden:
+            parts.append('\x1b[?25h')
+
+        data = ''.join(parts)
+        self.in_flight = self.version
+        self.stats['updates'] += 1
+        self.stats['rows'] += len(rows)
+        self.stats['bytes_out'] += len(data)
+        return self.version, full, data
+
+    def ack(self, version):
+        """The client has drawn the update with this version"""
+        if version == self.in_flight:
+            self.acked = version
+            self.in_flight = None
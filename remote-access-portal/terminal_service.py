@@ -0,0 +1,660 @@
+#!/usr/bin/env python3
+"""
+Automata Remote Access Portal - Terminal Service
+Terminal sessions, their tabs and read-only watchers, driven by the
+Socket.IO events both servers receive; the servers only route events here
+and deliver what it sends
+"""
+
+import secrets
+import time
+
+from config import CONFIG
+from recorder import Recordings
+from session_registry import SessionRegistry
+from shell_pool import ShellPool
+from terminal_mux import TerminalMux, channel_args
+from terminal_pump import OutputPump
+from terminal_screen import ScreenState, pyte
+from terminal_session import TerminalSession, Viewer
+
+
+class TerminalService:
+    """Every terminal session of one server process
+
+    send(event, data, to) emits a Socket.IO event to a sid or a list of
+    sids, keeping call order; a tuple as data is sent as several event
+    arguments. make_reactor() creates the reactor the PTYs are watched
+    from, on first use; start_task(fn) runs a shell pool refill.
+    Everything runs on the reactor's thread or task.
+    """
+
+    def __init__(self, send, make_reactor, start_task):
+        self.send = send
+        self.make_reactor = make_reactor
+        self.start_task = start_task
+
+        # Terminal channels (tabs) of each client connection, and the
+        # session each client is watching read-only
+        self.clients = {}
+        self.viewers = {}
+
+        # Single dispatcher for every terminal's PTY (created on first use)
+        self.reactor = None
+
+        # Pre-spawned shells handed out by connect
+        self.pool = None
+
+        # Terminal sessions by resumable token
+        self.registry = SessionRegistry(max_sessions=CONFIG['terminal_max_sessions'],
+                                        idle_timeout=CONFIG['terminal_idle_timeout'],
+                                        max_lifetime=CONFIG['terminal_max_lifetime'])
+
+        # Session recordings (written from a background thread)
+        self.recordings = Recordings(CONFIG['terminal_recordings_dir'],
+                                     CONFIG['terminal_recording_compression'])
+
+    def get_reactor(self):
+        """Start the shared terminal reactor once per process"""
+        if self.reactor is None:
+            self.reactor = self.make_reactor()
+            self.reactor.call_later(CONFIG['terminal_check_interval'], self._check_sessions)
+        return self.reactor
+
+    def get_pool(self):
+        """Create the warm shell pool once per process and start filling it"""
+        if self.pool is None:
+            reactor = self.get_reactor()
+            self.pool = ShellPool(reactor, self.start_task, self.registry.retire,
+                                  size=CONFIG['terminal_pool_size'],
+                                  max_idle=CONFIG['terminal_pool_max_idle'])
+            self.pool.schedule_refill()
+
+            # Check for stale shells a few times per max_idle period
+            period = max(30, CONFIG['terminal_pool_max_idle'] / 4)
+            def recycle():
+                self.pool.recycle()
+                reactor.call_later(period, recycle)
+            reactor.call_later(period, recycle)
+        return self.pool
+
+    def _check_sessions(self):
+        """Reactor timer: close timed-out sessions and reap exited shells"""
+        for term, reason in self.registry.expired():
+            print(f"Closing terminal session (pid {term.process.pid}): {reason}")
+            self.end_session(term, reason)
+        self.registry.reap()
+        for term in self.registry:
+            if term.recorder is not None and term.recorder.flush_due():
+                term.recorder.flush()
+        self.reactor.call_later(CONFIG['terminal_check_interval'], self._check_sessions)
+
+    # Sessions and channels
+
+    def client_terminal(self, sid, channel=None):
+        """Terminal session on one of this client's channels, if any"""
+        mux = self.clients.get(sid)
+        if mux is None:
+            return None
+        return self.registry.get(mux.channels.get(channel))
+
+    def _client_mux(self, sid):
+        """Channel multiplexer for this client, created on first use"""
+        mux = self.clients.get(sid)
+        if mux is None:
+            mux = self.clients[sid] = TerminalMux(
+                sid,
+                lambda channel, payload: self.send('terminal_output',
+                                                   channel_args(payload, channel), sid),
+                window=CONFIG['terminal_connection_window'])
+        return mux
+
+    def _release_channel(self, term):
+        """Take a session off its client's channel list"""
+        mux = self.clients.get(term.sid)
+        if mux is not None:
+            mux.drop(term.channel)
+
+    def _create_session(self, cols=80, rows=24):
+        """Take a shell from the warm pool and register it with the reactor"""
+        shell = self.get_pool().acquire()
+        master_fd, p = shell.master_fd, shell.process
+
+        token = secrets.token_urlsafe(24)
+        pump = OutputPump(
+            master_fd,
+            lambda frame: self._send_frame(token, frame),
+            frame_size=CONFIG['terminal_frame_size'],
+            frame_delay=CONFIG['terminal_frame_delay'],
+            high_water=CONFIG['terminal_high_water'],
+            low_water=CONFIG['terminal_low_water']
+        )
+        term = TerminalSession(token, master_fd, p, pump,
+                               CONFIG['terminal_scrollback_bytes'],
+                               CONFIG['terminal_input_max_queued'],
+                               CONFIG['terminal_echo_delay'])
+        self.registry.add(term)
+        if CONFIG['terminal_recording']:
+            term.recorder = self.recordings.start(p.pid, cols, rows)
+
+        # Whatever a warm shell printed while pooled (its prompt) is the start
+        # of the session's output
+        if shell.output:
+            term.scrollback.write(bytes(shell.output))
+            term.input.observe_output(bytes(shell.output))
+            if term.recorder is not None:
+                term.recorder.output(bytes(shell.output))
+
+        # Dispatch output from the shared reactor as soon as the PTY is readable
+        self.get_reactor().register(master_fd, lambda fd: self._read_output(token))
+        return term
+
+    def close_session(self, term):
+        """Tear down a session for good"""
+        self.registry.remove(term)
+        if term.sid is not None:
+            self._release_channel(term)
+        self.reactor.unregister(term.master_fd)
+        for timer in (term.flush_timer, term.expiry_timer):
+            if timer is not None:
+                self.reactor.cancel(timer)
+        if term.recorder is not None:
+            term.recorder.close()
+        if term.viewers:
+            self.send('terminal_exit', {}, list(term.viewers))
+            for sid in term.viewers:
+                self.viewers.pop(sid, None)
+        term.close()
+
+    def end_session(self, term, reason=None):
+        """Close a session, telling its client why after its last output"""
+        if term.sid is not None:
+            # Output still queued behind other tabs goes out before the exit
+            self.clients[term.sid].flush(term.channel)
+            self.send('terminal_exit', channel_args({'reason': reason} if reason else {},
+                                                    term.channel), term.sid)
+        self.close_session(term)
+
+    def _detach_session(self, term):
+        """Keep the shell running without a client until it times out"""
+        self._release_channel(term)
+        term.detach()
+
+        # Nobody is left to ack; read freely into the scrollback meanwhile
+        if term.pump.paused:
+            term.pump.reset_flow()
+            self.reactor.resume(term.master_fd)
+
+        def expire():
+            term.expiry_timer = None
+            if term.sid is None and term.token in self.registry:
+                self.close_session(term)
+
+        term.expiry_timer = self.reactor.call_later(CONFIG['terminal_detach_timeout'], expire)
+
+    def _record_first_output(self, term):
+        """Feed the open-to-prompt latency of a new session to the pool stats"""
+        if term.opened_at is not None:
+            self.pool.record_open(time.monotonic() - term.opened_at)
+            term.opened_at = None
+
+    # Socket.IO events
+
+    def connect(self, sid, data):
+        """Attach to a terminal session, resuming it if the client has a token
+
+        A resuming client passes 'token' and 'offset' (output bytes it already
+        has); it gets the missed output from the scrollback instead of a new
+        shell. 'reset' tells it the gap was too large and its screen should be
+        cleared before the replay. A client running several tabs on this
+        connection names each one with 'channel'; every event for that
+        session then carries the channel as a second argument.
+        """
+        channel = data.get('channel')
+        if self.client_terminal(sid, channel) is not None or sid in self.viewers:
+            return
+
+        requested_at = time.monotonic()
+        term = self.registry.get(data.get('token'))
+        resumed = term is not None
+        offset = data.get('offset', 0) if resumed else 0
+        if isinstance(offset, bool) or not isinstance(offset, int) or offset < 0:
+            self.send('terminal_error', channel_args({'error': 'offset must be a non-negative integer'},
+                                                     channel), sid)
+            return
+        if not resumed:
+            if self.registry.full():
+                # Make room by dropping a forgotten detached shell, if there is one
+                victim = self.registry.evictable()
+                if victim is None:
+                    self.send('terminal_error', channel_args({'error': 'Too many terminal sessions open'},
+                                                             channel), sid)
+                    return
+                self.close_session(victim)
+            term = self._create_session(data.get('cols', 80), data.get('rows', 24))
+            term.opened_at = requested_at
+
+        # Output still being batched belongs to whoever had the session until now
+        term.pump.flush()
+        if term.sid is not None:
+            # Session taken over by a newer connection (e.g. a reopened tab)
+            self.send('terminal_detached', channel_args({'reason': 'attached elsewhere'},
+                                                        term.channel), term.sid)
+            self._release_channel(term)
+        if term.expiry_timer is not None:
+            self.reactor.cancel(term.expiry_timer)
+            term.expiry_timer = None
+
+        mux = self._client_mux(sid)
+        term.attach(sid, bool(data.get('binary')), channel)
+        mux.channels[channel] = term.token
+
+        # Set terminal size
+        if 'cols' in data and 'rows' in data:
+            self.resize(sid, {
+                'cols': data['cols'],
+                'rows': data['rows'],
+                'channel': channel
+            })
+
+        # Screen clients get the current screen as row diffs, rebuilt from
+        # recent output when they attach, instead of a replay
+        screen = bool(data.get('screen')) and CONFIG['terminal_screen_mode'] and pyte is not None
+        term.screen_mode = screen
+        if not screen:
+            term.screen = None
+        elif term.screen is None:
+            token = term.token
+            term.screen = ScreenState(data.get('cols', 80), data.get('rows', 24),
+                                      respond=lambda answer: self._answer_query(token, answer))
+            term.screen.feed(term.snapshot(CONFIG['terminal_viewer_snapshot']))
+
+        # Predicting clients get every frame tagged with how much of their
+        # typed input it should reflect; a screen client has nothing to predict
+        term.predict = bool(data.get('predict')) and CONFIG['terminal_predictive_echo'] and not screen
+
+        reset = offset < term.scrollback.start or offset > term.scrollback.total
+        if screen:
+            offset, reset = term.scrollback.total, False
+        self.send('terminal_session', channel_args({
+            'token': term.token,
+            'watch_id': term.watch_id,
+            'resumed': resumed,
+            'reset': resumed and reset,
+            'offset': term.scrollback.start if reset else offset,
+            'paste_chunk': CONFIG['terminal_paste_chunk'],
+            'paste_window': CONFIG['terminal_paste_window'],
+            'screen': screen,
+            'predict': term.predict,
+            'probe_interval': CONFIG['terminal_probe_interval']
+        }, channel), sid)
+
+        if screen:
+            # Output still waiting to be fed stays unacked
+            term.pump.reset_flow(sum(map(len, term.screen.pending)))
+            if not term.pump.paused:
+                self.reactor.resume(term.master_fd)
+            term.screen.reset_client()
+            self._send_screen_update(term)
+            self._record_first_output(term)
+            return
+
+        if not resumed:
+            self.send('terminal_output', channel_args(
+                {'data': f'Connected to {CONFIG["controller_serial"]}\r\n'}, channel), sid)
+
+        # Replay what the client missed; it acks this like any other frame
+        missed = term.scrollback.read_from(offset)
+        term.pump.reset_flow(len(missed))
+        self.reactor.resume(term.master_fd)
+        if missed:
+            mux.send(channel, term.encode_output(missed), len(missed))
+            self._record_first_output(term)
+
+    def watch(self, sid, data):
+        """Watch another client's session read-only, given its 'watch_id'"""
+        if sid in self.clients or sid in self.viewers:
+            return
+
+        term = next((term for term in self.registry if term.watch_id == data.get('watch_id')), None)
+        if term is None:
+            self.send('terminal_error', {'error': 'Terminal session not found'}, sid)
+            return
+
+        viewer = Viewer(sid, bool(data.get('binary')), CONFIG['terminal_viewer_window'])
+        self.send('terminal_watching', {'pid': term.process.pid}, sid)
+
+        # Snapshot first: it flushes pending output, which must not also reach
+        # this viewer as a live frame
+        self._send_viewer_snapshot(term, viewer)
+        term.viewers[sid] = viewer
+        self.viewers[sid] = term.token
+
+    def _send_viewer_snapshot(self, term, viewer):
+        """Repaint a viewer from recent output and resume its live stream"""
+        term.pump.flush()
+        snapshot = term.snapshot(CONFIG['terminal_viewer_snapshot'])
+        viewer.lagging = False
+        viewer.unacked = len(snapshot)
+        if viewer.binary:
+            payload = snapshot
+        else:
+            payload = {'data': snapshot.decode('utf-8', errors='replace'), 'size': len(snapshot)}
+        self.send('terminal_snapshot', payload, viewer.sid)
+
+    def _watched_terminal(self, sid):
+        """Session this client is watching, and its Viewer"""
+        term = self.registry.get(self.viewers.get(sid))
+        if term is None:
+            return None, None
+        return term, term.viewers.get(sid)
+
+    def input(self, sid, data, channel=None):
+        """Handle terminal input from client"""
+        if isinstance(data, (bytes, bytearray)):
+            # Binary clients send already-encoded keystrokes (and the channel
+            # as a second argument)
+            term = self.client_terminal(sid, channel)
+            payload = data
+        else:
+            term = self.client_terminal(sid, data.get('channel'))
+            payload = data['data'].encode()
+        if term is None:
+            return
+
+        for paste_id in term.write(payload):
+            self.send('terminal_paste_progress', channel_args({'id': paste_id, 'cancelled': True},
+                                                              term.channel), sid)
+        self._watch_input(term)
+        if term.predict:
+            self._schedule_echo(term)
+
+    def paste(self, sid, data):
+        """One chunk of a paste: {'id', 'data' (bytes or text), 'final'}
+
+        The page sends at most paste_window chunks ahead of the
+        terminal_paste_progress reports, so a large paste is written as fast
+        as the shell reads it without piling up in server memory.
+        """
+        term = self.client_terminal(sid, data.get('channel'))
+        if term is None:
+            return
+
+        chunk = data['data']
+        if not isinstance(chunk, (bytes, bytearray)):
+            chunk = chunk.encode()
+        if not term.paste(str(data['id']), bytes(chunk), bool(data.get('final', True))):
+            self.send('terminal_paste_progress', channel_args({'id': data['id'], 'error': 'Paste is too large'},
+                                                              term.channel), sid)
+            return
+        self._watch_input(term)
+
+    def ack(self, sid, data):
+        """Client has written output frames to the screen"""
+        term = self.client_terminal(sid, data.get('channel'))
+        if term is None:
+            term, viewer = self._watched_terminal(sid)
+            if viewer is not None and viewer.ack(int(data.get('size', 0))):
+                # Lagging viewer has drained its queue; repaint and go live again
+                self._send_viewer_snapshot(term, viewer)
+            return
+
+        size = int(data.get('size', 0))
+        self.clients[sid].ack(term.channel, size)
+        pump = term.pump
+        was_paused = pump.paused
+        pump.ack(size)
+        if was_paused and not pump.paused:
+            self.reactor.resume(pump.fd)
+
+    def resize(self, sid, data):
+        """Handle terminal resize"""
+        term = self.client_terminal(sid, data.get('channel'))
+        if term is None:
+            return
+
+        term.resize(data['cols'], data['rows'])
+        if term.recorder is not None:
+            term.recorder.resize(data['cols'], data['rows'])
+        if term.screen is not None:
+            term.screen.resize(data['cols'], data['rows'])
+            if term.screen_mode:
+                self._send_screen_update(term)
+
+    def screen_ack(self, sid, data):
+        """Screen client drew an update; send the next one if the screen moved on"""
+        term = self.client_terminal(sid, data.get('channel'))
+        if term is None or not term.screen_mode:
+            return
+
+        term.screen.ack(int(data.get('version', 0)))
+        self._send_screen_update(term)
+
+    def probe(self, sid, data):
+        """Latency probe from the page: stamp it and send it straight back
+
+        The reply skips the tab's output queue, so it measures the link and
+        the hub rather than how much output is ahead of it.
+        """
+        received = time.time() * 1000
+        term = self.client_terminal(sid, data.get('channel'))
+        if term is None:
+            return
+
+        self.send('terminal_probe', channel_args({'id': data.get('id'), 'sent': data.get('sent'),
+                                                  'received': received, 'replied': time.time() * 1000},
+                                                 term.channel), sid)
+
+    def probe_result(self, sid, data):
+        """The page got a probe back: {'sent', 'received', 'replied', 'returned'} in ms"""
+        term = self.client_terminal(sid, data.get('channel'))
+        if term is None:
+            return
+
+        try:
+            term.latency.probe(*(float(data[key]) for key in ('sent', 'received', 'replied', 'returned')))
+        except (KeyError, TypeError, ValueError):
+            pass
+
+    def close(self, sid, data=None):
+        """Client is done with its shell (e.g. typed exit or closed the tab)"""
+        term = self.client_terminal(sid, (data or {}).get('channel'))
+        if term is not None:
+            self.close_session(term)
+
+    def disconnect(self, sid):
+        """Detach the client's terminal sessions; they can be resumed with their tokens"""
+        mux = self.clients.get(sid)
+        if mux is not None:
+            for token in list(mux.channels.values()):
+                term = self.registry.get(token)
+                if term is not None:
+                    self._detach_session(term)
+            del self.clients[sid]
+
+        term, viewer = self._watched_terminal(sid)
+        self.viewers.pop(sid, None)
+        if viewer is not None:
+            del term.viewers[sid]
+
+    # Input
+
+    def _watch_input(self, term):
+        """Report paste progress; wait for the PTY to take the rest of the queue"""
+        self._report_paste_progress(term)
+        if term.input.pending:
+            self.reactor.add_writer(term.master_fd, lambda fd: self._write_input(term.token))
+
+    def _write_input(self, token):
+        """Reactor callback: the PTY can take more queued input"""
+        term = self.registry.get(token)
+        if term is None:
+            return
+
+        term.input.drain()
+        if not term.input.pending:
+            self.reactor.remove_writer(term.master_fd)
+        self._report_paste_progress(term)
+
+    def _report_paste_progress(self, term):
+        """Tell the page how many chunks of each paste the shell has taken"""
+        for paste_id, chunks, done in term.input.progress():
+            if term.sid is not None:
+                self.send('terminal_paste_progress',
+                          channel_args({'id': paste_id, 'chunks': chunks, 'done': done},
+                                       term.channel), term.sid)
+
+    def _answer_query(self, token, answer):
+        """Reply to a device query on a screen client's behalf; its terminal never saw it"""
+        term = self.registry.get(token)
+        if term is not None and term.screen_mode:
+            term.input.write(answer)
+            self._watch_input(term)
+
+    # Output
+
+    def _read_output(self, token):
+        """Reactor callback: the session's PTY has output to pump"""
+        term = self.registry.get(token)
+        if term is None:
+            return
+
+        pump = term.pump
+        pump.read()
+
+        if pump.closed:
+            # Shell exited; send what's left and end the session
+            pump.flush()
+            self.end_session(term)
+            return
+        if pump.paused:
+            # Client is behind; leave output in the PTY until it acks
+            self.reactor.pause(pump.fd)
+
+        self._schedule_flush(term)
+
+    def _schedule_flush(self, term):
+        """Arrange for a partially filled frame to go out when it is due"""
+        if term.flush_timer is not None:
+            return
+
+        delay = term.pump.flush_delay()
+        if delay is None:
+            return
+
+        def flush():
+            term.flush_timer = None
+            if term.token in self.registry:
+                term.pump.flush()
+
+        term.flush_timer = self.reactor.call_later(delay, flush)
+
+    def _send_frame(self, token, frame):
+        """Record one batched output frame and send it to the attached client"""
+        term = self.registry.get(token)
+        if term is None:
+            return
+
+        term.scrollback.write(frame)
+        term.input.observe_output(frame)
+        term.last_active = time.monotonic()
+        if term.recorder is not None:
+            term.recorder.output(frame)
+        if term.viewers:
+            self._fan_out_frame(term, frame)
+        if term.sid is None:
+            # Detached: the frame only goes to the scrollback
+            term.pump.ack(len(frame))
+            return
+        term.latency.output()
+        if term.screen_mode:
+            # Screen clients get the current screen instead of the byte stream;
+            # the frame is acked once it has been applied to the screen
+            term.screen.pending.append(frame)
+            self._schedule_screen_feed(term)
+            self._record_first_output(term)
+            return
+
+        # Binary frames go out as Socket.IO attachments; the client acks the size.
+        # Tabs on the same connection take turns sending
+        self.clients[term.sid].send(term.channel, term.encode_output(frame), len(frame))
+        self._record_first_output(term)
+
+    def _fan_out_frame(self, term, frame):
+        """Send a frame to every watcher with room in its queue
+
+        Each encoding is built once and sent to all sids in one emit; lagging
+        viewers skip frames until they are resynced from a snapshot.
+        """
+        binary_sids, text_sids = term.viewer_targets(len(frame))
+        if binary_sids:
+            self.send('terminal_output', frame, binary_sids)
+        text = term.viewer_decoder.decode(frame)
+        if text_sids:
+            self.send('terminal_output', {'data': text, 'size': len(frame)}, text_sids)
+
+    def _schedule_echo(self, term):
+        """Check back once typed input has had time to echo"""
+        if term.echo_timer is None:
+            token = term.token
+            term.echo_timer = self.reactor.call_later(term.echo_delay,
+                                                      lambda: self._send_echo(token))
+
+    def _send_echo(self, token):
+        """Reactor timer: pass on an echo ack that no output frame has carried
+
+        Keystrokes at a password prompt produce no output, and the client
+        only judges its predictions once an ack covers them.
+        """
+        term = self.registry.get(token)
+        if term is None:
+            return
+
+        term.echo_timer = None
+        if not term.predict:
+            return
+        if term.input.echo_ack(term.echo_delay) > term.echo_sent:
+            # Buffered output goes first and carries the ack itself
+            term.pump.flush()
+        if term.input.echoed > term.echo_sent:
+            self.clients[term.sid].send(term.channel, term.encode_output(b''), 0)
+        if term.input.echo_pending:
+            self._schedule_echo(term)
+
+    def _send_screen_update(self, term):
+        """Send a screen client the rows changed since the update it last drew"""
+        update = term.screen.update()
+        if update is not None:
+            version, full, data = update
+            self.send('terminal_screen',
+                      channel_args({'version': version, 'full': full, 'data': data}, term.channel),
+                      term.sid)
+
+    def _schedule_screen_feed(self, term):
+        """Feed a screen client's pending output on a later reactor turn"""
+        if term.screen.timer is None:
+            token = term.token
+            term.screen.timer = self.reactor.call_later(0, lambda: self._feed_screen(token))
+
+    def _feed_screen(self, token):
+        """Reactor timer: apply one output frame to a screen client's screen
+
+        One frame per turn keeps pyte from holding up other sessions; frames
+        are acked as they are applied, so a flooding shell is paused by the
+        pump like one feeding a slow client.
+        """
+        term = self.registry.get(token)
+        if term is None or not term.screen_mode:
+            return
+
+        screen = term.screen
+        screen.timer = None
+        size = screen.feed_next()
+        pump = term.pump
+        was_paused = pump.paused
+        pump.ack(size)
+        if was_paused and not pump.paused:
+            self.reactor.resume(pump.fd)
+        if screen.pending:
+            self._schedule_screen_feed(term)
+        self._send_screen_update(term)
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Automata Remote Access Portal - Terminal Sessions
+PTY-backed shell sessions that outlive the Socket.IO connection viewing
+them, with a bounded scrollback so reconnecting clients can catch up
+"""
+
+import codecs
+import fcntl
+import os
+import secrets
+import struct
+import termios
+import time
+from datetime import datetime
+
+from terminal_input import InputWriter
+from terminal_latency import LatencyProbe
+
+
+class Scrollback:
+    """Fixed-size ring of the most recent output bytes
+
+    Positions are absolute byte offsets into the session's output stream,
+    so a client can say how much it has already seen and get only the rest.
+    """
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.buffer = bytearray(capacity)
+        self.total = 0  # Bytes ever written
+
+    def __len__(self):
+        return min(self.total, self.capacity)
+
+    @property
+    def start(self):
+        """Offset of the oldest byte still held"""
+        return self.total - len(self)
+
+    def write(self, data):
+        """Append output, overwriting the oldest bytes once full"""
+        if len(data) >= self.capacity:
+            self.total += len(data)
+            data = data[-self.capacity:]
+            pos = self.total % self.capacity
+            self.buffer[pos:] = data[:self.capacity - pos]
+            self.buffer[:pos] = data[self.capacity - pos:]
+            return
+
+        pos = self.total % self.capacity
+        end = pos + len(data)
+        if end <= self.capacity:
+            self.buffer[pos:end] = data
+        else:
+            split = self.capacity - pos
+            self.buffer[pos:] = data[:split]
+            self.buffer[:end - self.capacity] = data[split:]
+        self.total += len(data)
+
+    def read_from(self, offset):
+        """Bytes from offset to the end; clamped to what is still held"""
+        offset = min(max(offset, self.start), self.total)
+        count = self.total - offset
+        pos = offset % self.capacity
+        if pos + count <= self.capacity:
+            return bytes(self.buffer[pos:pos + count])
+        return bytes(self.buffer[pos:]) + bytes(self.buffer[:pos + count - self.capacity])
+
+
+class Viewer:
+    """A read-only client watching someone else's session
+
+    Frames sent but not yet acked are the viewer's queue; once it exceeds
+    the window the viewer stops getting frames (lagging) and is resynced
+    from a snapshot when it has caught up, so it never holds up the owner.
+    """
+
+    def __init__(self, sid, binary, window):
+        self.sid = sid
+        self.binary = binary
+        self.window = window
+        self.unacked = 0
+        self.lagging = False
+
+    def offer(self, nbytes):
+        """Account for a frame; returns False if the viewer should skip it"""
+        if self.lagging:
+            return False
+        if self.unacked + nbytes > self.window:
+            self.lagging = True
+            return False
+        self.unacked += nbytes
+        return True
+
+    def ack(self, nbytes):
+        """Viewer consumed nbytes; returns True if it is due for a resync"""
+        self.unacked = max(0, self.unacked - nbytes)
+        return self.lagging and self.unacked == 0
+
+
+class TerminalSession:
+    """A shell on a PTY, attached to at most one client channel at a time"""
+
+    def __init__(self, token, master_fd, process, pump, scrollback_bytes,
+                 input_max_queued=1024 * 1024, echo_delay=0.05):
+        self.token = token
+        self.master_fd = master_fd
+        self.process = process
+        self.pump = pump
+        self.scrollback = Scrollback(scrollback_bytes)
+        self.input = InputWriter(master_fd, max_queued=input_max_queued)
+        self.flush_timer = None
+        self.expiry_timer = None
+        self.opened_at = None  # When a new session was requested, until its first output
+        self.recorder = None
+
+        # Virtual screen (terminal_screen.ScreenState) for a client on a slow
+        # link that asked for screen diffs instead of the raw output
+        self.screen = None
+        self.screen_mode = False
+
+        # Predictive echo: the client draws keystrokes before the shell
+        # echoes them, and every frame says how much typed input has had
+        # echo_delay seconds to come back (see InputWriter.echo_ack)
+        self.predict = False
+        self.echo_delay = echo_delay
+        self.echo_sent = 0
+        self.echo_timer = None
+
+        # Keystroke latency histograms, fed by the page's probes
+        self.latency = LatencyProbe()
+
+        # Read-only watchers: sid -> Viewer, with one decoder shared by all
+        # text-mode viewers so each frame is decoded once
+        self.watch_id = secrets.token_urlsafe(9)
+        self.viewers = {}
+        self.viewer_decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+        # Accounting for the session registry
+        self.started = datetime.now().isoformat()
+        self.created_at = time.monotonic()
+        self.last_active = self.created_at
+        self.bytes_in = 0
+
+        # Attached client and its channel for this session (None while detached)
+        self.sid = None
+        self.channel = None
+        self.binary = False
+        self.decoder = None
+
+    def attach(self, sid, binary, channel=None):
+        """Bind the session to a client connection, as one of its channels"""
+        self.sid = sid
+        self.channel = channel
+        self.screen_mode = False
+        self.predict = False
+        self.echo_sent = 0
+        self.input.end_pastes()  # A previous client's paste ends here
+        self.input.reset_typed()
+        self.latency.new_client()
+        # Binary clients get raw PTY bytes; text clients get UTF-8 decoded
+        # incrementally so characters split across frames stay intact
+        self.binary = binary
+        self.decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+
+    def detach(self):
+        """Forget the client; the shell keeps running"""
+        self.sid = None
+        self.channel = None
+        self.screen = None
+        self.screen_mode = False
+        self.predict = False
+        self.decoder = None
+        self.input.end_pastes()
+
+    def encode_output(self, data):
+        """Payload for one terminal_output event in the client's mode
+
+        Predicting clients get {'data', 'size', 'echo', 'secret'} even in
+        binary mode; echo-only updates have empty data.
+        """
+        if self.binary and not self.predict:
+            return data
+        payload = {'data': data if self.binary else self.decoder.decode(data),
+                   'size': len(data)}
+        if self.predict:
+            payload['echo'] = self.echo_sent = self.input.echo_ack(self.echo_delay)
+            payload['secret'] = self.echo_hidden()
+        return payload
+
+    def echo_hidden(self):
+        """True while the shell reads a line with echo off (a password prompt)
+
+        Line editors like readline and full-screen programs turn canonical
+        mode off as well and do their own echo, so only that combination
+        means typed characters will not show up.
+        """
+        try:
+            lflag = termios.tcgetattr(self.master_fd)[3]
+        except termios.error:
+            return False
+        return bool(lflag & termios.ICANON) and not lflag & termios.ECHO
+
+    def viewer_targets(self, nbytes):
+        """Split viewers able to take an nbytes frame into (binary, text) sids"""
+        binary, text = [], []
+        for viewer in self.viewers.values():
+            if viewer.offer(nbytes):
+                (binary if viewer.binary else text).append(viewer.sid)
+        return binary, text
+
+    def snapshot(self, limit):
+        """Recent output to repaint a viewer's screen, starting at a line break"""
+        data = self.scrollback.read_from(self.scrollback.total - limit)
+        if self.scrollback.total > limit:
+            newline = data.find(b'\n')
+            if newline != -1:
+                data = data[newline + 1:]
+        return data
+
+    def write(self, data):
+        """Queue typed input for the shell; returns ids of pastes it cancelled"""
+        self.bytes_in += len(data)
+        self.last_active = time.monotonic()
+        if not self.echo_hidden():
+            self.latency.keystroke()
+        return self.input.write(data, typed=True)
+
+    def paste(self, paste_id, data, final):
+        """Queue one chunk of a paste; False if the input queue is full"""
+        if not self.input.paste(paste_id, data, final):
+            return False
+        self.bytes_in += len(data)
+        self.last_active = time.monotonic()
+        return True
+
+    def resize(self, cols, rows):
+        """Set the PTY window size"""
+        winsize = struct.pack('HHHH', rows, cols, 0, 0)
+        fcntl.ioctl(self.master_fd, termios.TIOCSWINSZ, winsize)
+
+    def close(self):
+        """Release the PTY (the registry hangs up and reaps the shell)"""
+        os.close(self.master_fd)
@@ -0,0 +1,91 @@
+"""
+Recovery of memory-mapped metric rings after an unclean stop
+"""
+
+import os
+import struct
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from history import MappedMetricsRing  # noqa: E402
+
+
+def filled_ring(path, samples, capacity=8):
+    ring = MappedMetricsRing(str(path), capacity)
+    for n in range(1, samples + 1):
+        ring.append(float(n), {'cpu': n, 'mem': n * 2})
+    return ring
+
+
+def times(ring):
+    return [timestamp for timestamp, _ in ring.records(0, float('inf'))]
+
+
+def test_reopen_keeps_samples(tmp_path):
+    path = tmp_path / 'metrics.ring'
+    filled_ring(path, 11).close()
+
+    ring = MappedMetricsRing(str(path), 8)
+    assert times(ring) == [4.0, 5.0, 6.0, 7.0, 8.0, 9.0, 10.0, 11.0]
+    assert list(ring.records(11, 12))[0][1][:2] == (11.0, 22.0)
+
+
+def test_torn_last_record_is_dropped(tmp_path):
+    path = tmp_path / 'metrics.ring'
+    ring = filled_ring(path, 5)
+    # Half-written sample 5: its values no longer match the checksum
+    offset = ring._offset(4) + 16
+    ring.mm[offset:offset + 4] = b'\xff\xff\xff\xff'
+    ring.close()
+
+    ring = MappedMetricsRing(str(path), 8)
+    assert times(ring) == [1.0, 2.0, 3.0, 4.0]
+    assert ring.seq == 4
+
+    # The next sample reuses the torn slot
+    ring.append(6.0, {'cpu': 6})
+    assert times(ring) == [1.0, 2.0, 3.0, 4.0, 6.0]
+
+
+def test_torn_record_after_wrap_leaves_its_slot_out(tmp_path):
+    path = tmp_path / 'metrics.ring'
+    ring = filled_ring(path, 10, capacity=4)
+    offset = ring._offset(1) + 16
+    ring.mm[offset:offset + 4] = b'\xff\xff\xff\xff'
+    ring.close()
+
+    # Slot of sample 10 still holds sample 6, which must not reappear
+    ring = MappedMetricsRing(str(path), 4)
+    assert times(ring) == [7.0, 8.0, 9.0]
+
+
+def test_recovers_when_header_lags_records(tmp_path):
+    path = tmp_path / 'metrics.ring'
+    ring = filled_ring(path, 5)
+    # Records 4 and 5 reached the file but the header update did not
+    struct.pack_into('<Q', ring.mm, MappedMetricsRing.HEADER.size - 8, 3)
+    ring.close()
+
+    ring = MappedMetricsRing(str(path), 8)
+    assert times(ring) == [1.0, 2.0, 3.0, 4.0, 5.0]
+    assert ring.seq == 5
+
+
+def test_incompatible_layout_resets(tmp_path):
+    path = tmp_path / 'metrics.ring'
+    ring = filled_ring(path, 5)
+    struct.pack_into('<I', ring.mm, 8, MappedMetricsRing.VERSION + 1)
+    ring.close()
+
+    ring = MappedMetricsRing(str(path), 8)
+    assert len(ring) == 0 and ring.seq == 0
+    assert ring._header_matches()
+    ring.append(1.0, {'cpu': 1})
+    ring.close()
+
+    # A different capacity changes the file size
+    ring = MappedMetricsRing(str(path), 16)
+    assert len(ring) == 0
+    assert os.path.getsize(path) == MappedMetricsRing.HEADER_SIZE + ring.record.size * 16
+    ring.close()
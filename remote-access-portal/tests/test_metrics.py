@@ -0,0 +1,61 @@
+"""
+Terminal latency is pushed on the /metrics stream, only to subscribers
+that opt in to it; history queries reject ranges they can't answer
+"""
+
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from history import open_history  # noqa: E402
+from metrics import MetricsPublisher  # noqa: E402
+from service_health import ServiceMonitor  # noqa: E402
+from session_registry import SessionRegistry  # noqa: E402
+
+
+def publisher(sessions):
+    monitor = ServiceMonitor(['nginx'])
+    monitor.due = lambda: False  # Never probe systemctl from a test
+    return MetricsPublisher(monitor, terminal_latency=lambda: {'sessions': list(sessions)})
+
+
+def test_snapshot_leaves_out_terminal_latency():
+    metrics = publisher([])
+    snapshot = metrics.publish(metrics.describe({'cpu_usage': 1.0}))
+    assert 'terminal_latency' not in snapshot.data
+
+
+def test_latency_pushed_every_sample_to_opted_in_subscribers():
+    sessions = [{'attached': True, 'legs': {}}]
+    metrics = publisher(sessions)
+    first = metrics.publish(metrics.describe({'cpu_usage': 1.0}))
+    metrics.subscribe('plain', {}, first)
+    metrics.subscribe('latency', {'terminal_latency': True}, first)
+
+    # Neither subscriber is due a metrics push, but latency goes out anyway
+    for _ in range(2):
+        snapshot = metrics.publish(metrics.describe({'cpu_usage': 1.0}))
+        assert metrics.pushes(snapshot) == [('terminal_latency', {'sessions': sessions}, ['latency'])]
+
+
+def test_latency_summary_has_no_client_or_process_ids():
+    term = SimpleNamespace(sid='abc', channel='tab-1', process=SimpleNamespace(pid=42),
+                           latency=SimpleNamespace(status=lambda: {'up': {'count': 0}}))
+    registry = SessionRegistry(max_sessions=1, idle_timeout=60, max_lifetime=60)
+    registry.sessions['token'] = term
+    assert registry.latency_summary() == {'sessions': [{'attached': True,
+                                                        'legs': {'up': {'count': 0}}}]}
+
+
+def test_history_query_rejects_non_finite_and_non_positive_values():
+    metrics = publisher([])
+    metrics.history = open_history(None, 5, 3600, [(60, 3600)])
+    for args in ({'from': 'nan'}, {'to': 'inf'}, {'from': '-inf'}, {'step': 'nan'},
+                 {'step': '0'}, {'step': '-5'}):
+        body, status = metrics.query({'from': '1000', 'to': '2000', **args})
+        assert status == 400, args
+
+    body, status = metrics.query({'from': '1000', 'to': '2000'})
+    assert status == 200 and body['from'] == 1000
@@ -0,0 +1,70 @@
+"""
+Reactor dispatch of PTY master fds, including ones whose shell has gone
+"""
+
+import os
+import pty
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from reactor import Reactor  # noqa: E402
+
+
+def hung_up_pty():
+    """A PTY master whose slave side is already closed"""
+    master, slave = pty.openpty()
+    os.set_blocking(master, False)
+    os.close(slave)
+    return master
+
+
+def run_for(reactor, seconds):
+    """Run the reactor for a while; returns how many turns it took"""
+    done = []
+    reactor.call_later(seconds, lambda: done.append(True))
+    turns = 0
+    while not done:
+        reactor.run_once()
+        turns += 1
+    return turns
+
+
+def test_paused_hung_up_fd_does_not_spin():
+    reactor = Reactor()
+    master = hung_up_pty()
+    calls = []
+    reactor.register(master, calls.append)
+    reactor.pause(master)
+    try:
+        assert run_for(reactor, 0.2) < 10
+        assert calls == []
+
+        reactor.resume(master)
+        run_for(reactor, 0.05)
+        assert calls
+    finally:
+        reactor.unregister(master)
+        os.close(master)
+
+
+def test_writer_keeps_paused_fd_watched():
+    reactor = Reactor()
+    master, slave = pty.openpty()
+    os.set_blocking(master, False)
+    writes = []
+    reactor.register(master, lambda fd: None)
+    reactor.pause(master)
+    reactor.add_writer(master, writes.append)
+    try:
+        run_for(reactor, 0.05)
+        assert writes
+
+        reactor.remove_writer(master)
+        del writes[:]
+        run_for(reactor, 0.05)
+        assert writes == []
+    finally:
+        reactor.unregister(master)
+        os.close(master)
+        os.close(slave)
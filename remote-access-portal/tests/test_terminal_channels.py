@@ -0,0 +1,79 @@
+"""
+Terminal sessions opened with a channel (one tab of a multiplexed
+connection) get every event tagged with that channel, errors included
+"""
+
+import os
+import sys
+
+import pytest
+from socketio import packet
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import server  # noqa: E402
+
+
+@pytest.fixture
+def client():
+    """Test client plus the events sent to it
+
+    python-socketio 5.9 sends emits straight to engine.io, past the hook
+    Flask-SocketIO 5.3's test client listens on, so catch them there.
+    """
+    client = server.socketio.test_client(server.app)
+    received = []
+    send_eio_packet = server.socketio.server._send_eio_packet
+
+    def capture(eio_sid, eio_pkt):
+        if eio_sid == client.eio_sid:
+            pkt = packet.Packet(encoded_packet=eio_pkt.data)
+            if pkt.packet_type == packet.EVENT:
+                received.append(pkt.data)
+        else:
+            send_eio_packet(eio_sid, eio_pkt)
+
+    server.socketio.server._send_eio_packet = capture
+    yield client, received
+    server.socketio.server._send_eio_packet = send_eio_packet
+    client.disconnect()
+
+
+def wait_for(received, name, timeout=5.0):
+    """Arguments of the events named name, waiting up to timeout for one"""
+    waited = 0.0
+    while waited < timeout:
+        events = [event[1:] for event in received if event[0] == name]
+        if events:
+            return events
+        server.socketio.sleep(0.05)
+        waited += 0.05
+    return []
+
+
+def test_channel_session_receives_output(client):
+    client, received = client
+    client.emit('terminal_connect', {'channel': '1', 'cols': 80, 'rows': 24})
+    session = wait_for(received, 'terminal_session')
+    assert session and session[0][1] == '1'
+    assert session[0][0]['token']
+
+    client.emit('terminal_input', {'data': 'echo channel-test\r', 'channel': '1'})
+    output = wait_for(received, 'terminal_output')
+    assert output
+    assert all(args[1] == '1' for args in output)
+    client.emit('terminal_close', {'channel': '1'})
+
+
+def test_resume_with_bad_offset_is_refused(client):
+    client, received = client
+    client.emit('terminal_connect', {'channel': '1', 'cols': 80, 'rows': 24})
+    [(session, _)] = wait_for(received, 'terminal_session')
+
+    for offset in (-1, 1.5, '10', None):
+        received.clear()
+        client.emit('terminal_connect', {'channel': '2', 'token': session['token'], 'offset': offset})
+        assert wait_for(received, 'terminal_error') == [
+            [{'error': 'offset must be a non-negative integer'}, '2']]
+        assert not [event for event in received if event[0] == 'terminal_session']
+    client.emit('terminal_close', {'channel': '1'})
@@ -0,0 +1,53 @@
+"""
+Bracketed pastes can't end early on a marker hidden in the pasted text,
+even one split across chunks
+"""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from terminal_input import (BRACKETED_PASTE_ON, PASTE_END, PASTE_START,  # noqa: E402
+                            InputWriter)
+
+
+@pytest.fixture
+def pipe():
+    read_fd, write_fd = os.pipe()
+    yield read_fd, write_fd
+    os.close(read_fd)
+    os.close(write_fd)
+
+
+def bracketed_writer(fd):
+    writer = InputWriter(fd)
+    writer.observe_output(BRACKETED_PASTE_ON)
+    return writer
+
+
+def test_end_marker_in_one_chunk_is_stripped(pipe):
+    read_fd, write_fd = pipe
+    writer = bracketed_writer(write_fd)
+    writer.paste('1', b'ls' + PASTE_END + b'; rm -rf ~')
+    assert os.read(read_fd, 4096) == PASTE_START + b'ls; rm -rf ~' + PASTE_END
+
+
+def test_end_marker_split_across_chunks_is_stripped(pipe):
+    read_fd, write_fd = pipe
+    writer = bracketed_writer(write_fd)
+    writer.paste('1', b'ls\x1b[20', final=False)
+    writer.paste('1', b'1~; rm -rf ~', final=False)
+    writer.paste('1', b'\n')
+    assert os.read(read_fd, 4096) == PASTE_START + b'ls; rm -rf ~\n' + PASTE_END
+
+
+def test_held_tail_is_written_when_client_goes_away(pipe):
+    read_fd, write_fd = pipe
+    writer = bracketed_writer(write_fd)
+    writer.paste('1', b'echo hi', final=False)
+    writer.end_pastes()
+    writer.drain()
+    assert os.read(read_fd, 4096) == PASTE_START + b'echo hi' + PASTE_END
@@ -0,0 +1,104 @@
+"""
+Pooled connections the upstream closed while idle are replaced quietly,
+but a non-idempotent request that went out is never sent twice
+"""
+
+import http.client
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from upstream import UpstreamClient, UpstreamError  # noqa: E402
+
+
+class FakeSocket:
+    def __init__(self):
+        self.timeout = None
+
+    def settimeout(self, timeout):
+        self.timeout = timeout
+
+
+class FakeResponse:
+    status = 200
+    reason = 'OK'
+    will_close = False
+
+    def read(self, amount=None):
+        return b'ok'
+
+    def isclosed(self):
+        return True
+
+    def getheaders(self):
+        return []
+
+
+class FakeConnection:
+    """Connection that fails its write or read phase, or answers 200"""
+
+    def __init__(self, sent, fail_write=None, fail_read=None):
+        self.sent = sent
+        self.fail_write = fail_write
+        self.fail_read = fail_read
+        self.sock = FakeSocket()
+        self.timeout = None
+
+    def request(self, method, target, body=None, headers=None):
+        if self.fail_write:
+            raise self.fail_write
+        self.sent.append(method)
+
+    def getresponse(self):
+        if self.fail_read:
+            raise self.fail_read
+        return FakeResponse()
+
+    def close(self):
+        pass
+
+
+def client_with(idle, sent):
+    """Client whose pool holds idle as kept-alive connections"""
+    client = UpstreamClient(retries=2, backoff=0)
+    pool = client._pool('http', 'upstream', 80, client.timeout)
+    pool.connect = lambda: FakeConnection(sent)
+    pool.idle = [(connection, float('inf')) for connection in idle]
+    return client
+
+
+def test_write_failure_on_idle_connection_is_stale():
+    sent = []
+    client = client_with([FakeConnection(sent, fail_write=BrokenPipeError())], sent)
+    status, _, _ = client.request('POST', 'http://upstream/flows', body=b'{}', timeout=3)
+    assert status == 200 and sent == ['POST']
+    assert client.stats['stale'] == 1 and client.stats['retries'] == 0
+
+
+def test_idempotent_request_replayed_after_hang_up():
+    sent = []
+    hang_up = http.client.RemoteDisconnected('Remote end closed connection without response')
+    client = client_with([FakeConnection(sent, fail_read=hang_up)], sent)
+    status, _, _ = client.request('GET', 'http://upstream/flows')
+    assert status == 200 and sent == ['GET', 'GET']
+    assert client.stats['stale'] == 1
+
+
+def test_sent_post_is_not_replayed():
+    sent = []
+    hang_up = http.client.RemoteDisconnected('Remote end closed connection without response')
+    client = client_with([FakeConnection(sent, fail_read=hang_up)], sent)
+    with pytest.raises(UpstreamError):
+        client.request('POST', 'http://upstream/flows', body=b'{}')
+    assert client.stats['stale'] == 0 and client.stats['failures'] == 1
+
+
+def test_timeout_reaches_pooled_socket():
+    sent = []
+    connection = FakeConnection(sent)
+    client = client_with([connection], sent)
+    client.request('GET', 'http://upstream/flows', timeout=3)
+    assert connection.sock.timeout == 3 and connection.timeout == 3
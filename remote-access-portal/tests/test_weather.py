@@ -0,0 +1,115 @@
+"""
+The weather cache makes one upstream call per interval, shared by every
+caller, and keeps serving stale data while a refresh runs
+"""
+
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from weather import WeatherCache  # noqa: E402
+
+
+class CountingUpstream:
+    """fetch() that counts calls and blocks while the gate is closed"""
+
+    def __init__(self):
+        self.calls = 0
+        self.started = threading.Event()
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def fetch(self, location, units):
+        self.calls += 1
+        self.started.set()
+        assert self.gate.wait(5)
+        return {'location': location, 'call': self.calls}
+
+
+def start_thread(fn, *args):
+    thread = threading.Thread(target=fn, args=args, daemon=True)
+    thread.start()
+    return thread
+
+
+@pytest.fixture
+def upstream():
+    return CountingUpstream()
+
+
+@pytest.fixture
+def cache(upstream):
+    return WeatherCache(upstream.fetch, start_thread, threading.Event, interval=60,
+                        retry_after=10, wait_timeout=5)
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def age_entry(cache, seconds):
+    """Pretend the cached entry was fetched seconds earlier"""
+    for entry in cache.entries.values():
+        entry.fetched_at -= seconds
+        entry.attempted_at -= seconds
+
+
+def test_concurrent_misses_share_one_upstream_call(cache, upstream):
+    upstream.gate.clear()
+    results = []
+    threads = [start_thread(lambda: results.append(cache.get('Paris,FR', 'metric')))]
+    assert upstream.started.wait(5)
+
+    # Everyone arriving while the first lookup is out waits for its answer
+    threads += [start_thread(lambda: results.append(cache.get('Paris,FR', 'metric')))
+                for _ in range(7)]
+    wait_for(lambda: cache.stats['coalesced'] == 7)
+    upstream.gate.set()
+    for thread in threads:
+        thread.join(5)
+
+    assert upstream.calls == 1
+    assert len(results) == 8
+    assert all(data == {'location': 'Paris,FR', 'call': 1} for data, _ in results)
+
+
+def test_stale_data_served_while_refreshing(cache, upstream):
+    cache.get('Paris,FR', 'metric')
+    age_entry(cache, 61)
+    upstream.started.clear()
+    upstream.gate.clear()
+
+    # The expired entry starts one background refresh and is served as is
+    data, age = cache.get('Paris,FR', 'metric')
+    assert data['call'] == 1 and age >= 60
+    assert upstream.started.wait(5)
+    data, _ = cache.get('Paris,FR', 'metric')
+    assert data['call'] == 1
+    assert upstream.calls == 2 and cache.stats['stale'] == 2
+
+    upstream.gate.set()
+    wait_for(lambda: cache.entries[('Paris,FR', 'metric')].pending is None)
+    data, age = cache.get('Paris,FR', 'metric')
+    assert data['call'] == 2 and age < 60
+
+
+def test_at_most_one_upstream_call_per_interval(cache, upstream):
+    for _ in range(20):
+        cache.get('Paris,FR', 'metric')
+    assert upstream.calls == 1
+
+    age_entry(cache, 61)
+    for _ in range(20):
+        cache.get('Paris,FR', 'metric')
+    wait_for(lambda: cache.entries[('Paris,FR', 'metric')].pending is None)
+    for _ in range(20):
+        cache.get('Paris,FR', 'metric')
+    assert upstream.calls == 2
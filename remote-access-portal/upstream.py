@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Automata Remote Access Portal - Upstream HTTP Client
+One keep-alive connection pool for every upstream the portal calls
+(Node-RED, the BMS query endpoint, weather), with per-host connection
+limits, timeouts and retries with jittered backoff
+"""
+
+import http.client
+import json
+import random
+import socket
+import ssl
+import threading
+import time
+from types import SimpleNamespace
+from urllib.parse import urlsplit
+
+# Safe to send twice if the first attempt may have reached the server
+IDEMPOTENT = {'GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE'}
+
+# Upstream is briefly unavailable; worth another try for idempotent calls
+RETRY_STATUSES = {502, 503, 504}
+
+
+class UpstreamError(OSError):
+    """An upstream call failed after all retries"""
+
+
+def green_modules(async_mode):
+    """http.client, socket, Semaphore, Event and sleep that cooperate with the hub
+
+    Under eventlet the green versions yield to other green threads while
+    waiting on an upstream, without monkey patching the whole process.
+    Threading mode uses the standard modules.
+    """
+    if async_mode == 'eventlet':
+        import eventlet
+        from eventlet.green import socket as green_socket
+        from eventlet.green import threading as green_threading
+        from eventlet.green.http import client as green_client
+        from eventlet.semaphore import Semaphore
+        return SimpleNamespace(http=green_client, socket=green_socket, Semaphore=Semaphore,
+                               Event=green_threading.Event, sleep=eventlet.sleep)
+    return SimpleNamespace(http=http.client, socket=socket, Semaphore=threading.Semaphore,
+                           Event=threading.Event, sleep=time.sleep)
+
+
+class Lease:
+    """A response being read on a pooled connection
+
+    close() hands the connection back for reuse if the response was read
+    to the end and the server allows keep-alive; otherwise it is closed.
+    """
+
+    def __init__(self, pool, connection, response):
+        self.pool = pool
+        self.connection = connection
+        self.response = response
+        self.status = response.status
+        self.reason = response.reason
+        self.released = False
+
+    def getheader(self, name, default=None):
+        return self.response.getheader(name, default)
+
+    def getheaders(self):
+        return self.response.getheaders()
+
+    def read(self, amount=None):
+        return self.response.read(amount)
+
+    def read1(self, amount=65536):
+        return self.response.read1(amount)
+
+    def close(self):
+        if self.released:
+            return
+        self.released = True
+        reusable = self.response.isclosed() and not self.response.will_close
+        self.pool.put(self.connection, reusable)
+
+
+class HostPool:
+    """Idle keep-alive connections to one scheme://host:port
+
+    At most limit connections are open (idle or busy) at once; callers
+    beyond that wait up to the client's timeout for one to come back.
+    """
+
+    def __init__(self, connect, limit, idle_timeout, semaphore_class):
+        self.connect = connect
+        self.limit = limit
+        self.idle_timeout = idle_timeout
+        self.slots = semaphore_class(limit)
+        self.idle = []  # (connection, idle since)
+        self.stats = {'opened': 0, 'reused': 0, 'busy': 0}
+
+    def get(self, timeout):
+        """(connection, reused) once a slot is free"""
+        if not self.slots.acquire(timeout=timeout):
+            raise UpstreamError(f"No free upstream connection within {timeout}s")
+        now = time.monotonic()
+        while self.idle:
+            connection, since = self.idle.pop()
+            if now - since < self.idle_timeout:
+                self.stats['reused'] += 1
+                self.stats['busy'] += 1
+                return connection, True
+            connection.close()
+        self.stats['opened'] += 1
+        self.stats['busy'] += 1
+        return self.connect(), False
+
+    def put(self, connection, reusable):
+        """Return a connection taken with get()"""
+        if reusable:
+            self.idle.append((connection, time.monotonic()))
+        else:
+            connection.close()
+        self.stats['busy'] -= 1
+        self.slots.release()
+
+    def status(self):
+        return {'idle': len(self.idle), 'limit': self.limit, **self.stats}
+
+
+class UpstreamClient:
+    """Pooled HTTP/1.1 client shared by every upstream call
+
+    Connection failures and 502/503/504 answers are retried up to retries
+    times for idempotent methods, sleeping a random 0..backoff*2^n seconds
+    (full jitter) so retries from many callers don't arrive together. A
+    reused connection the server had already closed is replaced at once
+    without counting as a retry, but only if the request failed before it
+    was written, or, for idempotent methods, the server hung up without
+    answering a byte; a non-idempotent request that went out is never sent
+    again.
+    """
+
+    def __init__(self, async_mode=None, max_per_host=4, timeout=10, retries=2,
+                 backoff=0.2, idle_timeout=30):
+        self.async_mode = async_mode
+        self.green = green_modules(async_mode)
+        self.max_per_host = max_per_host
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.idle_timeout = idle_timeout
+        self.pools = {}
+        self.stats = {'requests': 0, 'retries': 0, 'stale': 0, 'failures': 0}
+
+        # The green http.client has its own exception classes
+        self.errors = (OSError, http.client.HTTPException, self.green.http.HTTPException)
+        self.unanswered = (http.client.BadStatusLine, self.green.http.BadStatusLine)
+
+    def _pool(self, scheme, host, port, timeout):
+        key = (scheme, host, port)
+        pool = self.pools.get(key)
+        if pool is None:
+            if scheme == 'https':
+                context = ssl.create_default_context()
+                connect = lambda: self.green.http.HTTPSConnection(host, port, timeout=timeout,
+                                                                  context=context)
+            else:
+                connect = lambda: self.green.http.HTTPConnection(host, port, timeout=timeout)
+            pool = self.pools[key] = HostPool(connect, self.max_per_host, self.idle_timeout,
+                                              self.green.Semaphore)
+        return pool
+
+    def _delay(self, attempt):
+        return random.uniform(0, self.backoff * 2 ** attempt)
+
+    def _hung_up(self, error):
+        """The server closed the connection before sending any response bytes"""
+        # BadStatusLine (and its RemoteDisconnected subclass) stores an empty
+        # status line as repr('')
+        return isinstance(error, self.unanswered) and error.line == repr('')
+
+    def open(self, method, url, headers=None, body=None, timeout=None):
+        """Send a request and return a Lease once the response headers are in
+
+        The caller reads the body and must close() the lease.
+        """
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        timeout = timeout or self.timeout
+        pool = self._pool(parts.scheme, parts.hostname, port, timeout)
+        target = parts.path or '/'
+        if parts.query:
+            target += '?' + parts.query
+
+        self.stats['requests'] += 1
+        attempt = 0
+        while True:
+            connection, reused = pool.get(timeout)
+            written = False
+            try:
+                # A pooled connection already has its socket; the timeout
+                # attribute only applies when connecting
+                connection.timeout = timeout
+                if connection.sock is not None:
+                    connection.sock.settimeout(timeout)
+                connection.request(method, target, body=body, headers=headers or {})
+                written = True
+                response = connection.getresponse()
+            except self.errors as e:
+                pool.put(connection, False)
+                if reused and (not written or (method in IDEMPOTENT and self._hung_up(e))):
+                    # Keep-alive connection went away while idle
+                    self.stats['stale'] += 1
+                    continue
+                if method not in IDEMPOTENT or attempt >= self.retries:
+                    self.stats['failures'] += 1
+                    raise UpstreamError(f"{method} {url}: {e}") from e
+            else:
+                lease = Lease(pool, connection, response)
+                if (response.status not in RETRY_STATUSES or method not in IDEMPOTENT
+                        or attempt >= self.retries):
+                    return lease
+                response.read()
+                lease.close()
+
+            self.stats['retries'] += 1
+            self.green.sleep(self._delay(attempt))
+            attempt += 1
+
+    def request(self, method, url, headers=None, body=None, timeout=None):
+        """Complete request; returns (status, headers dict, body bytes)"""
+        lease = self.open(method, url, headers, body, timeout)
+        try:
+            data = lease.read()
+        except self.errors as e:
+            raise UpstreamError(f"{method} {url}: {e}") from e
+        finally:
+            lease.close()
+        return lease.status, dict(lease.getheaders()), data
+
+    def get_json(self, url, headers=None, timeout=None):
+        """GET url and decode a JSON body; raises UpstreamError on non-2xx"""
+        status, _, data = self.request('GET', url, headers, timeout=timeout)
+        if not 200 <= status < 300:
+            raise UpstreamError(f"GET {url}: HTTP {status}")
+        return json.loads(data)
+
+    def status(self):
+        """Request/retry counters and per-host pool usage"""
+        return {
+            **self.stats,
+            'hosts': {f"{scheme}://{host}:{port}": pool.status()
+                      for (scheme, host, port), pool in self.pools.items()}
+        }
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Automata Remote Access Portal - Weather
+Current conditions from OpenWeatherMap behind one shared cache, so the
+upstream sees a single request per update interval however many
+browsers are polling
+"""
+
+import time
+from urllib.parse import urlencode
+
+# What /api/weather answers when lookups are disabled or failing, as before
+DISABLED = {'temperature': 72, 'condition': 'Weather Disabled', 'humidity': 0,
+            'location': 'Local', 'icon': '01d'}
+UNAVAILABLE = {'temperature': 72, 'condition': 'API Error', 'humidity': 65,
+               'location': 'Local', 'icon': '01d'}
+
+
+class WeatherUnavailable(Exception):
+    """No weather data could be fetched and none is cached"""
+
+
+def openweather_fetcher(client, api_url, api_key):
+    """fetch(location, units) returning the portal's weather payload"""
+    def fetch(location, units):
+        query = urlencode({'q': location, 'units': units, 'appid': api_key})
+        data = client.get_json(f"{api_url}?{query}")
+        return {
+            'temperature': round(data['main']['temp']),
+            'condition': data['weather'][0]['main'],
+            'humidity': data['main']['humidity'],
+            'location': data['name'],
+            'icon': data['weather'][0]['icon'],
+            'windSpeed': round(data['wind']['speed']),
+            'windDirection': data['wind'].get('deg'),
+            'pressure': data['main']['pressure'],
+            'feelsLike': round(data['main']['feels_like'])
+        }
+    return fetch
+
+
+class CacheEntry:
+    def __init__(self):
+        self.data = None
+        self.fetched_at = None
+        self.attempted_at = 0.0
+        self.error = None
+        self.pending = None  # Event set when the running fetch finishes
+
+
+class WeatherCache:
+    """Weather by (location, units), refreshed at most once per interval
+
+    Once an entry is older than interval it is still served (stale) while
+    one background task fetches a new copy. Callers with nothing cached
+    yet share a single upstream request: the first one fetches, the rest
+    wait on its Event. After a failed fetch the upstream is left alone
+    for retry_after seconds, and any stale data keeps being served.
+    """
+
+    def __init__(self, fetch, start_task, event_class, interval=600, retry_after=60,
+                 wait_timeout=15):
+        self.fetch = fetch
+        self.start_task = start_task
+        self.event_class = event_class
+        self.interval = interval
+        self.retry_after = retry_after
+        self.wait_timeout = wait_timeout
+        self.entries = {}
+        self.stats = {'hits': 0, 'stale': 0, 'coalesced': 0, 'upstream': 0, 'errors': 0}
+
+    def _due(self, entry, now):
+        if entry.pending is not None:
+            return False
+        wait = self.retry_after if entry.error else self.interval
+        return now - entry.attempted_at >= wait
+
+    def _refresh(self, key, entry):
+        """Fetch one entry; whoever started it has set entry.pending"""
+        entry.attempted_at = time.monotonic()
+        self.stats['upstream'] += 1
+        try:
+            entry.data = self.fetch(*key)
+            entry.fetched_at = time.monotonic()
+            entry.error = None
+        except Exception as e:
+            entry.error = str(e)
+            self.stats['errors'] += 1
+            print(f"Weather lookup failed for {key[0]}: {e}")
+        finally:
+            pending, entry.pending = entry.pending, None
+            pending.set()
+
+    def get(self, location, units):
+        """(payload, age in seconds) for a location, fetching only if nothing is cached"""
+        key = (location, units)
+        entry = self.entries.setdefault(key, CacheEntry())
+        now = time.monotonic()
+
+        if entry.data is not None:
+            if self._due(entry, now):
+                entry.pending = self.event_class()
+                self.start_task(self._refresh, key, entry)
+            if now - entry.fetched_at < self.interval:
+                self.stats['hits'] += 1
+            else:
+                self.stats['stale'] += 1
+            return entry.data, now - entry.fetched_at
+
+        if entry.pending is not None:
+            # Someone is already asking upstream; wait for their answer
+            self.stats['coalesced'] += 1
+            entry.pending.wait(self.wait_timeout)
+        elif self._due(entry, now):
+            entry.pending = self.event_class()
+            self._refresh(key, entry)
+        if entry.data is None:
+            raise WeatherUnavailable(entry.error or 'weather lookup still pending')
+        return entry.data, time.monotonic() - entry.fetched_at
+
+    def status(self):
+        now = time.monotonic()
+        return {
+            'interval': self.interval,
+            'entries': [{'location': location, 'units': units,
+                         'age': None if entry.fetched_at is None else round(now - entry.fetched_at, 1),
+                         'refreshing': entry.pending is not None,
+                         'error': entry.error}
+                        for (location, units), entry in self.entries.items()],
+            **self.stats
+        }